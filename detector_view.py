@@ -1,6 +1,6 @@
 
 from PyQt5.QtCore import Qt
-from PyQt5.QtWidgets import QGraphicsView, QMenu
+from PyQt5.QtWidgets import QGraphicsView, QMenu, QApplication
 
 from specbox import SpecBox, flip_vertical
 
@@ -15,10 +15,16 @@ class View(QGraphicsView):
         self._view_tab = view_tab
         self.setDragMode(QGraphicsView.RubberBandDrag)
 
+        # the background brush does not change, so it is rendered once and reused when the view is repainted
+        self.setCacheMode(QGraphicsView.CacheBackground)
+
         self._scale_factor = 1.0
 
         self._ignore_count = 0
 
+        self._screen_geometry = None  # the geometry of the screen showing the View; see self.screen_geometry()
+        self._window_handle = None  # the window whose screenChanged signal refreshes self._screen_geometry
+
         self.setMouseTracking(True)
 
         self.setTransform(flip_vertical, True)
@@ -60,6 +66,30 @@ class View(QGraphicsView):
         self._ignore_count = max(0, self._ignore_count - 1)
         return result
 
+    def screen_geometry(self):
+        """
+        Returns the geometry of the screen on which the View is displayed. Looking up the geometry involves calls to the
+        window system, so it is cached and only refreshed when the View's window moves to a different screen.
+        """
+        if self._screen_geometry is None:
+            handle = self.window().windowHandle()
+
+            if handle is None:
+                # the window has not been shown yet, so there is no screen to track
+                display = QApplication.desktop()
+                return display.screenGeometry(display.screenNumber(self))
+
+            if handle is not self._window_handle:
+                handle.screenChanged.connect(self._screen_changed)
+                self._window_handle = handle
+
+            self._screen_geometry = handle.screen().geometry()
+
+        return self._screen_geometry
+
+    def _screen_changed(self, screen):
+        self._screen_geometry = screen.geometry()
+
     def keyPressEvent(self, event):
 
         increment = 1.05
@@ -11,11 +11,12 @@ import sys
 import os
 import inspect
 import json
+from collections import OrderedDict
 
 import numpy as np
 from astropy.io import fits
 
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QObject, QRunnable, QThreadPool, QTimer, pyqtSignal
 from PyQt5.QtGui import QIcon
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QTabWidget, QFileDialog, QAction, QMessageBox)
 
@@ -23,18 +24,30 @@ from view_tab import ViewTab
 from object_tab import ObjectTab
 from info_window import DetectorInfoWindow
 from reader import DecontaminatedSpectraCollection, LocationTable, NISP_DETECTOR_MAP
+from layer_cache import LayerCache
+import utils
 
 
 class Inspector:
     """
     The inSpector application class, which is the core (main) component of the inSpector.
     """
+
+    max_cached_pixmaps = 16  # the number of tone-mapped detector images that are kept in memory
+
     def __init__(self, app):
 
         self.app = app
 
         self.collection = None  # this will hold the DecontaminatedSpectraCollection
         self.exposures = None  # this will hold the detectors as a nested map {dither: {detector: pixels}}
+        self._exposure_pixmaps = OrderedDict()  # {(dither, detector): pixmap}, the most recently used pixmap is last
+        self._exposure_limits = {}  # {(dither, detector): (maxval, minval)}
+        self._exposure_tone_maps = {}  # {(dither, detector): the parameters returned by utils.tone_map()}
+        self._prefetching = set()  # the (dither, detector) keys of the pixmaps that are being prefetched
+        self._exposure_generation = 0  # incremented whenever the exposures are loaded; see self._exposure_prefetched()
+        self._exposure_files = {}  # {dither: (absolute path, mtime in ns, size)} of the files of the exposures
+        self.layer_cache = LayerCache()  # the on-disk cache of the model and residual layers of the detectors
         self.spectra = None  # this will hold a map connecting object IDs with spectra, in the format:
                              # {object_id: {dither: {detector: spectrum}}
 
@@ -187,11 +200,6 @@ class Inspector:
                 message.exec()
             self.app.restoreOverrideCursor()
 
-            # connect the search box
-            if self.collection is not None:
-                for view_tab in self.view_tab:
-                    view_tab.selection_area.searchbox.returnPressed.connect(view_tab.select_spectrum)
-
         if self.collection is None and filename != '':
             m = QMessageBox(0, 'Error', 'Encountered error while loading the spectra. Make sure the correct paths '
                             'were specified.')
@@ -205,6 +213,8 @@ class Inspector:
         # need to update the detector views
 
         for view_tab in self.view_tab:
+            view_tab.clear_layer_images()
+            view_tab.discard_boxes()
             view_tab.update_view()
 
     def merge_spectra(self):
@@ -251,6 +261,12 @@ class Inspector:
             nisp_exposure_filenames = json.load(f)
 
         self.exposures = {}  # {dither: {detector: image}}
+        self._exposure_pixmaps.clear()
+        self._prefetching.clear()
+        self._exposure_generation += 1  # the results of the prefetches that are still running are rejected
+        self._exposure_limits.clear()
+        self._exposure_tone_maps.clear()
+        self._exposure_files.clear()
 
         fits_magic = 'SIMPLE  =                    T'
 
@@ -272,11 +288,15 @@ class Inspector:
                 f.close()
             exposure = fits.open(full_path, memmap=True)
             dither = exposure[0].header['DITHSEQ']
+            stat = os.stat(full_path)
+            self._exposure_files[dither] = (os.path.abspath(full_path), stat.st_mtime_ns, stat.st_size)
             self.exposures[dither] = {}
             for detector in NISP_DETECTOR_MAP:
                 self.exposures[dither][detector] = exposure[f'DET{NISP_DETECTOR_MAP[detector]}.SCI']
 
         for view_tab in self.view_tab:
+            view_tab.clear_layer_images()
+            view_tab.discard_boxes()
             view_tab.init_view()
 
         self._session['exposures'] = nisp_exposures_json_file
@@ -357,6 +377,108 @@ class Inspector:
                     spec = self.collection.get_spectrum(dither, detector, object_id)
                     self.spectra[object_id][dither][detector] = spec
 
+    def get_exposure_pixmap(self, dither, detector):
+        """
+        Returns the tone-mapped pixmap of the specified detector image. The pixmaps of the most recently viewed
+        detectors are cached, so that switching back to a detector, in any View tab, does not repeat the tone-mapping.
+        """
+        key = (dither, detector)
+
+        pixmap = self._exposure_pixmaps.get(key)
+
+        if pixmap is None:
+            # if this pixmap was evicted from the cache, then the parameters of its tone mapping are reused, so that
+            # the histograms of the image are not computed again
+            data = self.exposures[dither][detector].data
+            maxval, minval = self.get_exposure_limits(dither, detector)
+            pixels, self._exposure_tone_maps[key] = utils.tone_map(data, maxval, minval,
+                                                                   self._exposure_tone_maps.get(key))
+            pixmap = utils.grayscale_to_pixmap(pixels)
+            self._exposure_pixmaps[key] = pixmap
+            if len(self._exposure_pixmaps) > Inspector.max_cached_pixmaps:
+                self._exposure_pixmaps.popitem(last=False)
+        else:
+            self._exposure_pixmaps.move_to_end(key)
+
+        return pixmap
+
+    def get_exposure_source(self, dither, detector):
+        """
+        Identifies the version of the specified detector image: returns a tuple of (absolute path, mtime in ns, size)
+        of the file from which the exposure was loaded, followed by the name of the detector's HDU.
+        """
+        return self._exposure_files.get(dither, ()) + (f'DET{NISP_DETECTOR_MAP[detector]}.SCI',)
+
+    def get_exposure_limits(self, dither, detector):
+        """
+        Returns the maximum and minimum pixel values of the specified detector image. These are computed only once per
+        detector image, rather than every time that the image, or an image derived from it, is tone-mapped.
+        """
+        key = (dither, detector)
+
+        limits = self._exposure_limits.get(key)
+
+        if limits is None:
+            data = self.exposures[dither][detector].data
+            limits = self._exposure_limits[key] = data.max(), data.min()
+
+        return limits
+
+    def prefetch_exposure_pixmaps(self, keys):
+        """
+        Starts tone-mapping the specified detector images on worker threads, so that their pixmaps are already cached
+        when they are viewed. Images whose pixmaps are cached, or are already being prefetched, are skipped.
+        :param keys: An iterable of (dither, detector) tuples.
+        """
+        for key in keys:
+            if key in self._exposure_pixmaps or key in self._prefetching:
+                continue
+
+            dither, detector = key
+
+            self._prefetching.add(key)
+
+            # the data are retrieved here, rather than on the worker thread, because astropy loads them lazily
+            worker = ExposureWorker(self._exposure_generation, dither, detector, self.exposures[dither][detector].data,
+                                    self._exposure_limits.get(key), self._exposure_tone_maps.get(key))
+            worker.signals.finished.connect(self._exposure_prefetched)
+            QThreadPool.globalInstance().start(worker)
+
+    def _exposure_prefetched(self, result):
+        """
+        Receives a tone-mapped detector image from an ExposureWorker and caches its pixmap, which can only be created
+        on the GUI thread.
+        """
+        generation, dither, detector, limits, tone_map, pixels = result
+        key = (dither, detector)
+
+        if generation != self._exposure_generation:
+            # the exposures were replaced while the image was being tone-mapped. The same detector may have been
+            # prefetched again since then, so the key may be in self._prefetching, but for the newer worker.
+            return
+
+        self._prefetching.discard(key)
+
+        self._exposure_limits[key] = limits
+        self._exposure_tone_maps[key] = tone_map
+
+        if key not in self._exposure_pixmaps:
+            self._exposure_pixmaps[key] = utils.grayscale_to_pixmap(pixels)
+            if len(self._exposure_pixmaps) > Inspector.max_cached_pixmaps:
+                self._exposure_pixmaps.popitem(last=False)
+
+    def get_exposure_tone_map(self, dither, detector):
+        """
+        Returns the parameters of the tone mapping of the specified detector image (see `utils.tone_map()`), which are
+        used for displaying images derived from the detector image on the same scale.
+        """
+        key = (dither, detector)
+
+        if key not in self._exposure_tone_maps:
+            self.get_exposure_pixmap(dither, detector)
+
+        return self._exposure_tone_maps[key]
+
     def get_object_dithers(self, object_id):
         """
         Returns a list of dithers in which the object with the specified object ID appears.
@@ -396,7 +518,6 @@ class Inspector:
 
         if self.exposures is not None:
             new_view_tab.init_view()
-            new_view_tab.selection_area.searchbox.returnPressed.connect(new_view_tab.select_spectrum)
 
         if dither is not None and detector is not None:
             new_view_tab.change_dither(dither - 1)
@@ -436,6 +557,7 @@ class Inspector:
         item = self.tabs.widget(tab_index)
         if item in self.view_tab:
             self.detector_info_window.update_detector(item.current_dither, item.current_detector)
+            QTimer.singleShot(0, item.prefetch_neighbors)
 
     def save_session(self):
         """
@@ -511,12 +633,53 @@ class Inspector:
         return main, tabs
 
 
+class ExposureSignals(QObject):
+    """
+    The signals of an ExposureWorker. A QRunnable is not a QObject, so it cannot have signals of its own.
+    """
+    finished = pyqtSignal(object)
+
+
+class ExposureWorker(QRunnable):
+    """
+    Tone-maps a detector image on a thread from a QThreadPool (see `Inspector.prefetch_exposure_pixmaps()`). The
+    limits and the parameters of the tone mapping are computed, unless they are provided. The results are sent back via
+    `signals.finished`, as a tuple of (generation, dither, detector, limits, tone_map, pixels), where `generation` is
+    the generation of the Inspector's exposures when the worker was created.
+    """
+
+    def __init__(self, generation, dither, detector, data, limits, tone_map):
+        super().__init__()
+        self.signals = ExposureSignals()
+        self._generation = generation
+        self._dither = dither
+        self._detector = detector
+        self._data = data
+        self._limits = limits
+        self._tone_map = tone_map
+
+    def run(self):
+        data = self._data
+        limits = self._limits
+
+        if limits is None:
+            limits = data.max(), data.min()
+
+        maxval, minval = limits
+
+        pixels, tone_map = utils.tone_map(data, maxval, minval, self._tone_map)
+
+        self.signals.finished.emit((self._generation, self._dither, self._detector, limits, tone_map, pixels))
+
+
 if __name__ == '__main__':
 
     app = QApplication(sys.argv)
 
     app.setAttribute(Qt.AA_EnableHighDpiScaling, True)
 
+    app.setApplicationName('inspector')  # determines the location of the LayerCache
+
     inspector = Inspector(app)
 
     app.exec()
@@ -0,0 +1,111 @@
+import os
+import hashlib
+
+import numpy as np
+
+from PyQt5.QtCore import QStandardPaths
+
+
+class LayerCache:
+    """
+    A cache of tone-mapped layer images (see `ViewTab._start_layer_worker()`), which is stored on disk, so that the
+    model and residual layers of a detector do not need to be recomputed in later sessions. Each image is stored in a
+    .npy file, named by a key that identifies the inputs of the image. When the total size of the files exceeds
+    `max_size`, the least recently used files are deleted.
+
+    The cache is only an optimization, so errors while reading or writing the files are ignored. If no directory is
+    specified and Qt does not provide a cache location, the cache is disabled: nothing is loaded or saved. The methods
+    may be called from worker threads.
+    """
+
+    max_size = 500 * 1024 ** 2  # bytes
+
+    def __init__(self, directory=None):
+        if directory is None:
+            location = QStandardPaths.writableLocation(QStandardPaths.CacheLocation)
+            # an empty location would otherwise put the cache in the current working directory
+            directory = os.path.join(location, 'layers') if location else None
+
+        self.directory = directory
+
+    @staticmethod
+    def key(*fields):
+        """
+        Computes a key from the string representations of the fields, which should identify all of the inputs of an
+        image.
+        """
+        return hashlib.blake2b('|'.join(str(field) for field in fields).encode(), digest_size=16).hexdigest()
+
+    def load(self, key):
+        """
+        Returns the image stored under the specified key, or None if there is no such image.
+        """
+        if self.directory is None:
+            return None
+
+        path = self._path(key)
+
+        try:
+            image = np.load(path)
+            os.utime(path)  # mark the file as recently used
+        except (OSError, ValueError):
+            return None
+
+        return image
+
+    def save(self, key, image):
+        """
+        Stores an image under the specified key.
+        """
+        if self.directory is None:
+            return
+
+        path = self._path(key)
+
+        # the image is written to a temporary file, which is then renamed, so that a file that is being written is
+        # never read by another thread
+        temporary_path = f'{path}.{os.getpid()}.{id(image)}.tmp'
+
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(temporary_path, 'wb') as f:
+                np.save(f, image)
+            os.replace(temporary_path, path)
+        except OSError:
+            # the temporary file is not counted by self._prune(), so it would never be deleted otherwise
+            try:
+                os.remove(temporary_path)
+            except OSError:
+                pass
+            return
+
+        self._prune()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.npy')
+
+    def _prune(self):
+        """
+        Deletes the least recently used files, until the total size of the cache is no more than `max_size`.
+        """
+        files = []
+
+        try:
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    if entry.name.endswith('.npy'):
+                        stat = entry.stat()
+                        files.append((stat.st_mtime, stat.st_size, entry.path))
+        except OSError:
+            return
+
+        total_size = sum(size for _, size, _ in files)
+
+        for _, size, path in sorted(files):
+            if total_size <= LayerCache.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total_size -= size
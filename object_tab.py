@@ -17,10 +17,6 @@ import utils
 J_WAV = 13697.01  # in angstroms
 H_WAV = 17761.52  # in angstroms
 
-flag = {"ZERO": np.uint32(2**18),     # zeroth-order: bit 18
-        "MISSING": np.uint32(2**19),  # missing data: bit 19
-        "SIGCONT": np.uint32(2**20)}  # significantly contaminated; contamination flux is > 10% of source flux: bit 20
-
 
 class PlotSelector(QWidget):
     """
@@ -203,9 +199,11 @@ class SpecPlot:
                     plot = self._plot(dither, detector)
                     self._windows.append(plot)
 
-    def _calibrate_spectrum(self, dither, spec_1d, wavelengths):
+    def _calibration(self, dither, wavelengths):
         """
-        Applies the calibration correction to convert `spec_1d` from detector units to erg/s/cm^2/Angstrom
+        Returns the factors that convert a 1D spectrum, sampled at `wavelengths`, from detector units to
+        erg/s/cm^2/Angstrom. The factors are computed once per plot and applied to each of the plotted spectra, so
+        that the sensitivity curve is only interpolated once.
         """
         if self._inspector.sensitivities[dither] is None:
             m = QMessageBox(self._inspector, 'You need to load the grism sensitivity curves first.')
@@ -222,7 +220,7 @@ class SpecPlot:
 
         inverse_sensitivity = utils.div0(1.0, sensitivity_value)
 
-        return utils.interp_multiply(wavelengths, spec_1d / denom, sensitivity_wav, inverse_sensitivity)
+        return utils.interp_multiply(wavelengths, 1.0 / denom, sensitivity_wav, inverse_sensitivity)
 
     def _plot(self, dither, detector):
         if self._data_series == 0:
@@ -263,23 +261,24 @@ class SpecPlot:
             x_max = max(pixels[short_wav_end], pixels[long_wav_end])
             plot.axis.set_xlim((x_min, x_max))
 
-        zeroth_mask = np.sum(spec.mask & flag['ZERO'], axis=dispersion_axis)
+        zeroth_mask = spec.zeroth_mask.any(axis=dispersion_axis)
+
+        calibration = self._calibration(dither, wavelengths) if plot_flux else None
 
         if self._data_series & PlotSelector.S_ORIG == PlotSelector.S_ORIG:
             if plot_flux:
-                uncalibrated = np.sum(spec.science + spec.contamination, axis=dispersion_axis)
-                y_values = self._calibrate_spectrum(dither, uncalibrated, wavelengths)
+                y_values = spec.original.sum(axis=dispersion_axis) * calibration
             else:
-                y_values = np.sum(spec.science + spec.contamination, axis=dispersion_axis)
+                y_values = spec.original.sum(axis=dispersion_axis)
 
-            y_values = np.ma.masked_where(zeroth_mask != 0, y_values)
+            y_values = np.ma.masked_where(zeroth_mask, y_values)
 
             plot.axis.plot(x_values, y_values[i_min: i_max], label='original spectrum', color='k', linewidth=0.5,
                            alpha=0.7)
 
         if self._data_series & PlotSelector.S_CONTAM == PlotSelector.S_CONTAM:
             if plot_flux:
-                y_values = self._calibrate_spectrum(dither, spec.contamination.sum(dispersion_axis), wavelengths)
+                y_values = spec.contamination.sum(dispersion_axis) * calibration
             else:
                 y_values = spec.contamination.sum(dispersion_axis)
 
@@ -288,11 +287,11 @@ class SpecPlot:
 
         if self._data_series & PlotSelector.S_DECON == PlotSelector.S_DECON:
             if plot_flux:
-                y_values_unmasked = self._calibrate_spectrum(dither, spec.science.sum(dispersion_axis), wavelengths)
+                y_values_unmasked = spec.science.sum(dispersion_axis) * calibration
             else:
                 y_values_unmasked = spec.science.sum(dispersion_axis)
 
-            y_values = np.ma.masked_where(zeroth_mask != 0, y_values_unmasked)
+            y_values = np.ma.masked_where(zeroth_mask, y_values_unmasked)
 
             plot.axis.plot(x_values, y_values[i_min: i_max], label='decontaminated spectrum', color='b', linewidth=0.9)
 
@@ -300,7 +299,7 @@ class SpecPlot:
             model = self._inspector.collection.get_model(dither, detector, self._object_id, order=1)
             if model is not None:
                 if plot_flux:
-                    y_values = self._calibrate_spectrum(dither, model.pixels.sum(dispersion_axis), wavelengths)
+                    y_values = model.pixels.sum(dispersion_axis) * calibration
                 else:
                     y_values = model.pixels.sum(dispersion_axis)
 
@@ -12,7 +12,7 @@ matplotlib.use('Qt5Agg')
 
 from matplotlib.backends.backend_qt5agg import FigureCanvas
 from matplotlib.backends.backend_qt5agg import NavigationToolbar2QT as NavigationToolbar
-from matplotlib import pyplot as plt
+from matplotlib.figure import Figure
 import numpy as np
 
 from syntax import PythonHighlighter
@@ -63,16 +63,19 @@ class PlotWindow(QWidget):
 
         self.title = title
 
+        # the figure is created directly, rather than through pyplot, so that it is owned by this window alone and does
+        # not need to be removed from pyplot's registry of figures
+
+        self.fig = Figure(dpi=100)
+
         if shape is None:
-            self.fig, self.axis = plt.subplots()
+            self.axis = self.fig.subplots()
             self.axis.set_title(self.title)
         else:
             rows, columns = shape
-            self.fig, self.axis = plt.subplots(rows, columns)
+            self.axis = self.fig.subplots(rows, columns)
             self.fig.suptitle(title)
 
-        self.fig.set_dpi(100)
-
         self.figure_widget = FigureCanvas(self.fig)
         self.figure_widget.setMinimumHeight(500)
 
@@ -109,7 +112,9 @@ class PlotWindow(QWidget):
 
     def closeEvent(self, event):
         self.closing.emit(self._descriptor)
-        plt.close(self.fig)
+        # release the artists and the AGG buffer now, rather than whenever the window happens to be garbage collected
+        self.fig.clf()
+        self.figure_widget.deleteLater()
         super().closeEvent(event)
 
     def show_editor(self):
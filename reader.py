@@ -16,6 +16,10 @@ GRISM_POSITION_LABEL = 'Grism Position'
 EXPOSURE_ID_LABEL = 'Exposure ID'
 FIELD_ID_LABEL = 'Field ID'
 
+flag = {"ZERO": 1 << 18,     # zeroth-order: bit 18
+        "MISSING": 1 << 19,  # missing data: bit 19
+        "SIGCONT": 1 << 20}  # significantly contaminated; contamination flux is > 10% of source flux: bit 20
+
 
 NISP_DETECTOR_MAP = {1: '11',
                      2: '21',
@@ -159,7 +163,9 @@ class DecontaminatedSpectrum:
                  '_science',        # [NumPy ndarray] The decontaminated science layer.
                  '_variance',       # [NumPy ndarray] Variance of the decontaminated science layer.
                  '_mask',           # [NumPy ndarray] Mask layer, containing decontamination flags
+                 '_zeroth_mask',    # [NumPy ndarray] True where the ZERO flag is set; computed on first access.
                  '_contamination',  # [NumPy ndarray] The total contamination for this spectrum.
+                 '_original',       # [NumPy ndarray] science + contamination; computed on first access.
                  '_contaminants',   # [NumPy ndarray] A table listing contaminants (id, order).
                  '_solution',       # [DispersionSolution] Contains inverse dispersion solution, etc.
                  '_x_offset',       # [int] x-coordinate of the lower-left pixel of the cutout
@@ -174,7 +180,9 @@ class DecontaminatedSpectrum:
         self._science = None
         self._variance = None
         self._mask = None
+        self._zeroth_mask = None
         self._contamination = None
+        self._original = None
         self._contaminants = None
         self._solution = None
         self._x_offset = None
@@ -207,6 +215,7 @@ class DecontaminatedSpectrum:
     def science(self, sci):
         utils.verify_2d_numpy_array(sci)
         self._science = sci
+        self._original = None
 
     @property
     def variance(self):
@@ -232,6 +241,17 @@ class DecontaminatedSpectrum:
     def mask(self, mask):
         utils.verify_2d_numpy_array(mask)
         self._mask = mask
+        self._zeroth_mask = None
+
+    @property
+    def zeroth_mask(self):
+        """
+        The pixels that are flagged as being contaminated by zeroth orders [NumPy ndarray, bool]. This is computed when
+        it is first accessed and is reused until the mask layer is replaced.
+        """
+        if self._zeroth_mask is None:
+            self._zeroth_mask = np.bitwise_and(self._mask, flag['ZERO']).astype(bool)
+        return self._zeroth_mask
 
     @property
     def contamination(self):
@@ -245,6 +265,17 @@ class DecontaminatedSpectrum:
     def contamination(self, contam):
         utils.verify_2d_numpy_array(contam)
         self._contamination = contam
+        self._original = None
+
+    @property
+    def original(self):
+        """
+        The spectrum before decontamination; the sum of the science and contamination layers [NumPy ndarray, float32].
+        This is computed when it is first accessed and is reused until either of the two layers is replaced.
+        """
+        if self._original is None:
+            self._original = self._science + self._contamination
+        return self._original
 
     @property
     def contaminants(self):
@@ -442,6 +473,9 @@ class DecontaminatedSpectraCollection:
         # if the object loads one or more HDF5 files from disk, then the spectral models are stored here:
         self._hdf5_models = {}
 
+        # {(dither, detector): [(filename, modification time, size)]}, the files from which each detector was loaded
+        self._source_files = {}
+
         if filename is not None:
             self.load(filename)
 
@@ -515,6 +549,16 @@ class DecontaminatedSpectraCollection:
         """
         return self._exposure_grism_position[dither]
 
+    def get_source_files(self, dither, detector):
+        """
+        Lists the files from which the spectra and models of the specified detector of the specified dither were loaded.
+        :param dither: the dither index, an integer (1, 2, 3, 4)
+        :param detector: The detector of interest within the specified dither (1, ..., 16).
+        :return: A tuple of (filename, modification time in nanoseconds, size in bytes) tuples, which identify the
+        versions of the files.
+        """
+        return tuple(self._source_files.get((dither, detector), ()))
+
     def get_spectrum(self, dither, detector, object_id):
         """
         Get the DecontaminatedSpectrum object corresponding to the object with the specified ID on the specified dither
@@ -564,6 +608,30 @@ class DecontaminatedSpectraCollection:
 
         return model
 
+    def get_cutouts(self, dither, detector, order=None):
+        """
+        Get the positions and pixels of either the decontaminated science layers or the models of all of the spectra in
+        the specified detector of the specified dither. Unlike `get_spectrum()`, this does not compute the total
+        contamination of each spectrum, so it is suitable for assembling images of entire detectors.
+        :param dither: The dither (exposure) in which the spectra of interest are located (1, 2, 3, 4).
+        :param detector: The detector on which the spectra of interest are located (1, ..., 16).
+        :param order: The spectral order of the models, or None for the decontaminated science layers.
+        :return: A dict {object_id: (x_offset, y_offset, pixels)}, in the same order as `get_object_ids()`. Objects
+        that do not have a model of the specified order are omitted.
+        """
+        if order is None:
+            spectra = self._hdf5_spectra.get(dither, {}).get(detector, {})
+            return {object_id: (spec.x_offset, spec.y_offset, spec.science) for object_id, spec in spectra.items()}
+
+        cutouts = {}
+
+        for object_id, models in self._hdf5_models.get(dither, {}).get(detector, {}).items():
+            model = models.get(order)
+            if model is not None:
+                cutouts[object_id] = model.x_offset, model.y_offset, model.pixels
+
+        return cutouts
+
     def load(self, filename):
         """
         Loads a DecontaminatedSpectraCollection HDF5 file or a list of files.
@@ -594,7 +662,12 @@ class DecontaminatedSpectraCollection:
 
         y_offset = decontaminated_spectrum.y_offset
 
-        total_contamination = (x_offset, y_offset), decontaminated_spectrum.contamination
+        # the total is accumulated in a new array, so that repeated calls do not add the contaminants more than once
+        contamination = np.zeros_like(decontaminated_spectrum.science)
+
+        total_contamination = (x_offset, y_offset), contamination
+
+        contaminant_fluxes = []
 
         for contaminant in contaminants:
             model_id = contaminant['id']
@@ -602,8 +675,11 @@ class DecontaminatedSpectraCollection:
 
             if model_order != 0:  # we do not attempt to model the zeroth-order spectra
                 contam = self.get_model(dither, detector, model_id, model_order)
-                contaminant_flux = (contam.x_offset, contam.y_offset), contam.pixels
-                utils.apply_contaminant(contaminant_flux, total_contamination)
+                contaminant_fluxes.append(((contam.x_offset, contam.y_offset), contam.pixels))
+
+        utils.apply_contaminants(contaminant_fluxes, total_contamination)
+
+        decontaminated_spectrum.contamination = contamination
 
     def _load_json(self, filename):
         """
@@ -708,6 +784,10 @@ class DecontaminatedSpectraCollection:
         self._load_spectra_from_hdf5(h5_file)
         self._load_models_from_hdf5(h5_file)
 
+        stat = os.stat(filename)
+        self._source_files.setdefault((dither, detector), []).append((os.path.abspath(filename), stat.st_mtime_ns,
+                                                                      stat.st_size))
+
     def _load_spectra_from_hdf5(self, hdf5_file):
         dither = hdf5_file.attrs[DITHER_LABEL]
         detector = hdf5_file.attrs['Detector']
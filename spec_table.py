@@ -1,10 +1,57 @@
-import numpy as np
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex
+from PyQt5.QtWidgets import QTableView, QApplication
 
-from PyQt5.QtCore import Qt
-from PyQt5.QtWidgets import QTableWidget, QTableWidgetItem, QApplication
 
+class SpecTableModel(QAbstractTableModel):
+    """
+    A read-only table model containing spectra IDs and orders. The contents are replaced all at once, using
+    `set_contents()`, so that the view is only updated once, regardless of the number of rows.
+    """
+
+    HEADERS = ('Object ID', 'Order')
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self._contents = ()
+
+    def set_contents(self, contents):
+        """
+        Replaces the contents of the model.
+
+        Parameters
+        ----------
+
+        contents: NumPy array
+            An array with named columns. Column 0: 'id', Column1: 'order'
+        """
+        self.beginResetModel()
+        self._contents = contents
+        self.endResetModel()
+
+    def object_id(self, row):
+        return str(self._contents[row][0])
 
-class SpecTable(QTableWidget):
+    def order(self, row):
+        return int(self._contents[row][1])
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._contents)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(SpecTableModel.HEADERS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and index.isValid():
+            return str(self._contents[index.row()][index.column()])
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return SpecTableModel.HEADERS[section]
+        return super().headerData(section, orientation, role)
+
+
+class SpecTable(QTableView):
     """
     A Table widget for displaying spectra IDs and orders. Currently, this is intended to be used to display a
     table of contaminating spectra, but it could be generalized.
@@ -13,14 +60,13 @@ class SpecTable(QTableWidget):
     def __init__(self, view, *args):
         super().__init__(*args)
         self.view = view
-        self.setHorizontalHeaderLabels(['Object ID', 'Order'])
-        self.data = None
-        self.itemSelectionChanged.connect(self.handle_selection)
-        self.cellActivated.connect(self.handle_activated_cell)
+        self.setModel(SpecTableModel(self))
+        self.selectionModel().selectionChanged.connect(self.handle_selection)
+        self.activated.connect(self.handle_activated_cell)
 
-    def add_spectra(self, data):
+    def set_contents(self, data):
         """
-        Adds spectral data to the table widget
+        Replaces the contents of the table with the spectral data and resizes the table to fit its contents.
 
         Parameters
         ----------
@@ -28,30 +74,14 @@ class SpecTable(QTableWidget):
         data: NumPy array
             An array with named columns. Column 0: 'id', Column1: 'order'
         """
-        if self.data is None:
-            self.data = data
-        else:
-            np.concatenate((self.data, data))
-
-        for i, row_data in enumerate(data):
-            self.add_row(i, row_data)
-
-    def add_row(self, row_index, row_data):
-        object_id, order = row_data
-
-        id_item = QTableWidgetItem(str(object_id))
-        order_item = QTableWidgetItem(str(order))
-
-        id_item.setFlags(id_item.flags() & ~Qt.ItemIsEditable)
-        order_item.setFlags(order_item.flags() & ~Qt.ItemIsEditable)
-
-        self.setItem(row_index, 0, id_item)
-        self.setItem(row_index, 1, order_item)
+        self.model().set_contents(data)
+        self.fit_to_contents()
 
+    def fit_to_contents(self):
         padding = 32
 
-        width = self.verticalHeader().width() + self.columnCount() * self.columnWidth(0) + 8
-        height = self.horizontalHeader().height() + self.rowCount() * self.rowHeight(0) + 8
+        width = self.verticalHeader().width() + self.model().columnCount() * self.columnWidth(0) + 8
+        height = self.horizontalHeader().height() + self.model().rowCount() * self.rowHeight(0) + 8
 
         display = QApplication.desktop()
 
@@ -68,31 +98,29 @@ class SpecTable(QTableWidget):
 
         self.setGeometry(cursor_x - padding, cursor_y, width, height)
 
-    def handle_activated_cell(self, i, j):
+    def handle_activated_cell(self, index):
         """
         This is currently just a placeholder. If double click or other selection events occur in a table cell, they
         can be candled here. Currently, double clicking or pressing Enter / Return only prints the cell coordinates.
         """
-        print(f'cell {i}, {j}, has been activated.')
+        print(f'cell {index.row()}, {index.column()}, has been activated.')
 
     def handle_selection(self):
+        model = self.model()
+
+        selected_rows = {index.row() for index in self.selectionModel().selectedIndexes()}
+
         # unpin any spectra that are not selected
-        for row in range(self.rowCount()):
-            id_item = self.item(row, 0)
-            order_item = self.item(row, 1)
-            if not id_item.isSelected() and not order_item.isSelected():
-                self.view.view_tab.unselect_spectrum_by_id(id_item.text())
+        for row in range(model.rowCount()):
+            if row not in selected_rows:
+                self.view.view_tab.unselect_spectrum_by_id(model.object_id(row))
 
         # pin the selected spectra
-        for item in self.selectedItems():
-            row = item.row()
-            object_id = self.item(row, 0).text()
-            order = int(self.item(row, 1).text())
-            if order == 1:
-                self.view.view_tab.select_spectrum_by_id(object_id)
+        for row in selected_rows:
+            if model.order(row) == 1:
+                self.view.view_tab.select_spectrum_by_id(model.object_id(row))
 
     def keyPressEvent(self, event):
 
         if event.key() == Qt.Key_Q or event.key() == Qt.Key_Escape:
             self.close()
-
@@ -1,24 +1,19 @@
-import numpy as np
 import matplotlib as mpl
 mpl.use('Qt5Agg')
-import matplotlib.pyplot as plt
 
-from PyQt5.QtCore import Qt, QRectF
+from PyQt5.QtCore import Qt, QRectF, QObject, QRunnable, QThreadPool, pyqtSignal
 from PyQt5.QtGui import QColor, QPen, QTransform
 from PyQt5.QtWidgets import (QGraphicsRectItem, QMenu, QAction, QGraphicsTextItem, QGraphicsItem,
-                             QGraphicsSceneMouseEvent, QApplication, QMessageBox)
+                             QGraphicsSceneMouseEvent, QMessageBox)
 
 from spec_table import SpecTable
 from plot_window import PlotWindow
 from info_window import ObjectInfoWindow
+import utils
 
 
 flip_vertical = QTransform(1.0, 0.0, 0.0, 0.0, -1.0, 0.0, 0.0, 0.0, 1.0)
 
-flag = {"ZERO": np.uint32(2**18),     # zeroth-order: bit 18
-        "MISSING": np.uint32(2**19),  # missing data: bit 19
-        "SIGCONT": np.uint32(2**20)}  # significantly contaminated; contamination flux is > 10% of source flux: bit 20
-
 
 red_pen = QPen(QColor('red'))
 green_pen = QPen(QColor('green'))
@@ -32,6 +27,28 @@ class SpecBox(QGraphicsRectItem):
 
     inactive_opacity = 0.21  # the opacity of rectangles that are not in focus
 
+    # maps keys to the names of the methods that they trigger; the methods are looked up when the key is pressed, so
+    # that the instances do not each need to store their own table of bound methods.
+    _KEY_BINDINGS = {Qt.Key_Up:    'plot_column_sums',
+                     Qt.Key_Down:  'plot_column_sums',
+                     Qt.Key_Right: 'plot_row_sums',
+                     Qt.Key_Left:  'plot_row_sums',
+                     Qt.Key_S:     'show_decontaminated',
+                     Qt.Key_D:     'show_decontaminated',
+                     Qt.Key_V:     'show_variance',
+                     Qt.Key_C:     'show_contamination',
+                     Qt.Key_L:     'show_contaminant_table',
+                     Qt.Key_T:     'show_contaminant_table',
+                     Qt.Key_0:     'show_zeroth_orders',
+                     Qt.Key_Z:     'show_zeroth_orders',
+                     Qt.Key_R:     'show_residual',
+                     Qt.Key_O:     'show_original',
+                     Qt.Key_A:     'show_all_layers',
+                     Qt.Key_M:     'show_model',
+                     Qt.Key_I:     'show_info',
+                     Qt.Key_Home:  'open_analysis_tab',
+                     Qt.Key_Space: 'open_all_spectra'}
+
     def __init__(self, *args):
         rect = QRectF(*args)
         super().__init__(rect)
@@ -44,28 +61,20 @@ class SpecBox(QGraphicsRectItem):
         self.label = None
         self._spec = None
         self._model = None
+        self._residual = None
         self._contam_table = None
         self._info_window = None
+        self._projections = None  # the (contamination, science, original) pixel sums along axes 0 and 1
 
-        self._key_bindings = {Qt.Key_Up:   self.plot_column_sums,
-                              Qt.Key_Down: self.plot_column_sums,
-                              Qt.Key_Right: self.plot_row_sums,
-                              Qt.Key_Left: self.plot_row_sums,
-                              Qt.Key_S:    self.show_decontaminated,
-                              Qt.Key_D:    self.show_decontaminated,
-                              Qt.Key_V:    self.show_variance,
-                              Qt.Key_C:    self.show_contamination,
-                              Qt.Key_L:    self.show_contaminant_table,
-                              Qt.Key_T:    self.show_contaminant_table,
-                              Qt.Key_0:    self.show_zeroth_orders,
-                              Qt.Key_Z:    self.show_zeroth_orders,
-                              Qt.Key_R:    self.show_residual,
-                              Qt.Key_O:    self.show_original,
-                              Qt.Key_A:    self.show_all_layers,
-                              Qt.Key_M:    self.show_model,
-                              Qt.Key_I:    self.show_info,
-                              Qt.Key_Home: self.open_analysis_tab,
-                              Qt.Key_Space: self.open_all_spectra}
+        # PlotWindows that are reused each time a plot of the corresponding type is shown
+        self._layer_window = None
+        self._sums_window = None
+        self._all_layers_window = None
+        self._layer_image = None  # the AxesImage displayed in self._layer_window
+
+        # the context menu and its section label are built by self._ensure_menu() when the box is first right-clicked
+        self._menu_section = None
+        self._context_menu = None
 
     @property
     def spec(self):
@@ -74,6 +83,14 @@ class SpecBox(QGraphicsRectItem):
     @spec.setter
     def spec(self, spec):
         self._spec = spec
+        self._residual = None
+        self._projections = None
+        self._layer_window = None
+        self._sums_window = None
+        self._all_layers_window = None
+        self._layer_image = None
+        if self._menu_section is not None:
+            self._menu_section.setText(f'Object {spec.id}')
 
     @property
     def model(self):
@@ -82,6 +99,17 @@ class SpecBox(QGraphicsRectItem):
     @model.setter
     def model(self, model):
         self._model = model
+        self._residual = None
+
+    @property
+    def residual(self):
+        """
+        The decontaminated science layer minus the model, or None if there is no model. This is computed when it is
+        first accessed and is reused until either the spectrum or the model is replaced.
+        """
+        if self._residual is None and self._model is not None:
+            self._residual = self._spec.science - self._model
+        return self._residual
 
     @property
     def view(self):
@@ -134,6 +162,7 @@ class SpecBox(QGraphicsRectItem):
         self.setPen(red_pen)
         self.setOpacity(1.0)
         self.pinned = True
+        self.view.view_tab.box_pinned(self)
 
     def unpin(self):
         """
@@ -144,16 +173,34 @@ class SpecBox(QGraphicsRectItem):
             self.scene().removeItem(self.label)
             self.label = None
         self.pinned = False
+        if self.scene() is not None:
+            self.view.view_tab.box_unpinned(self)
 
     def keyPressEvent(self, event):
-        if event.key() in self._key_bindings:
-            self._key_bindings[event.key()]()
+        method_name = SpecBox._KEY_BINDINGS.get(event.key())
+        if method_name is not None:
+            getattr(self, method_name)()
 
     def handle_right_click(self, pos):
         """
         Handles right-click (context menu) events. This implementation turned out to be more robust than implementing
         the virtual function for handling context menu events.
         """
+        self._ensure_menu()
+        self._context_menu.exec(pos)
+
+        self.view.ignore_clicks()
+
+    def _ensure_menu(self):
+        """
+        Constructs the context menu that is shown by `self.handle_right_click()`, unless it already exists. The menu is
+        built the first time that it is needed and is then kept, so that most boxes, which are never right-clicked, do
+        not carry a menu, and right-clicking does not need to re-create the menu, its actions, and their signal
+        connections.
+        """
+        if self._context_menu is not None:
+            return
+
         menu = QMenu()
 
         def action(title, slot, caption=None, shortcut=None):
@@ -167,7 +214,8 @@ class SpecBox(QGraphicsRectItem):
                 act.setShortcutVisibleInContextMenu(True)
             return act
 
-        menu.addSection(f'Object {self.spec.id}')
+        # the text of the section is also updated whenever a new spectrum is assigned (see the `spec` setter)
+        self._menu_section = menu.addSection(f'Object {self.spec.id}' if self.spec is not None else 'Object')
 
         menu.addAction(action('Show table of contaminants', self.show_contaminant_table, shortcut='T'))
         menu.addAction(action('Show Object Info', self.show_info, 'Show details about this object', 'I'))
@@ -188,9 +236,7 @@ class SpecBox(QGraphicsRectItem):
         menu.addAction(action('Show residual', self.show_residual, shortcut='R'))
         menu.addAction(action('Show model spectrum', self.show_model, shortcut='M'))
 
-        menu.exec(pos)
-
-        self.view.ignore_clicks()
+        self._context_menu = menu
 
     def plot_column_sums(self):
         self.plot_pixel_sums(0, 'Column')
@@ -198,24 +244,70 @@ class SpecBox(QGraphicsRectItem):
     def plot_row_sums(self):
         self.plot_pixel_sums(1, 'Row')
 
+    def pixel_sums(self, axis):
+        """
+        Returns the sums of the contamination, the decontaminated science pixels, and the original pixels along the
+        specified axis, as a tuple (contamination, science, original). The sums along both axes are computed together,
+        the first time that either one is requested, and are kept until a different spectrum is assigned to this box.
+        The original sum is obtained by adding the 1D sums of the other two layers, rather than by reducing the 2D
+        original image.
+        """
+        if self._projections is None:
+            projections = []
+            for a in (0, 1):
+                contamination = self.spec.contamination.sum(axis=a)
+                science = self.spec.science.sum(axis=a)
+                projections.append((contamination, science, science + contamination))
+            self._projections = tuple(projections)
+
+        return self._projections[axis]
+
     def plot_pixel_sums(self, axis, label):
 
-        plot = PlotWindow(f'{self.spec.id} {label} Sum')
-
-        plt.sca(plot.axis)
-        science = self.spec.science.sum(axis=axis)
-        contamination = self.spec.contamination.sum(axis=axis)
-        plt.plot(contamination, alpha=0.6, label='Contamination')
-        plt.plot(science + contamination, alpha=0.6, label='Original')
-        plt.plot(science, label='Decontaminated')
-        plt.title(f'Object ID: {self.spec.id}')
-        plt.xlabel(f'Pixel {label}')
-        plt.ylabel(f'{label} Sum')
-        plt.legend()
-        plt.draw()
+        plot = self._reuse_plot_window('_sums_window', f'{self.spec.id} {label} Sum')
+
+        contamination, science, original = self.pixel_sums(axis)
+        plot.axis.plot(contamination, alpha=0.6, label='Contamination')
+        plot.axis.plot(original, alpha=0.6, label='Original')
+        plot.axis.plot(science, label='Decontaminated')
+        plot.axis.set_title(f'Object ID: {self.spec.id}')
+        plot.axis.set_xlabel(f'Pixel {label}')
+        plot.axis.set_ylabel(f'{label} Sum')
+        plot.axis.legend()
+        plot.figure_widget.draw_idle()
         plot.show()
         plot.adjustSize()
-        plt.close()
+
+    def _reuse_plot_window(self, name, title):
+        """
+        Returns the single-plot PlotWindow stored in the attribute called `name`, after clearing its axes and giving it
+        the title, `title`. A new PlotWindow is created if there is no such window, or if it has been closed. Reusing
+        the window avoids creating a new figure and canvas each time that a plot is shown.
+        """
+        plot = getattr(self, name)
+
+        if plot is None:
+            plot = PlotWindow(title)
+            self._keep_plot_window(name, plot)
+        else:
+            plot.title = title
+            plot.setWindowTitle(title)
+            plot.axis.clear()
+            plot.axis.set_title(title)
+
+        return plot
+
+    def _keep_plot_window(self, name, plot):
+        """
+        Stores the PlotWindow, `plot`, in the attribute called `name`, so that it can be reused. The attribute is reset
+        to None when the window is closed, unless it refers to a newer window by then.
+        """
+        setattr(self, name, plot)
+        plot.closing.connect(lambda descriptor: self._forget_plot_window(name, plot))
+
+    def _forget_plot_window(self, name, plot):
+        if getattr(self, name) is plot:
+            setattr(self, name, None)
 
     def show_variance(self):
         title = f'Variance of {self.spec.id}'
@@ -231,17 +323,16 @@ class SpecBox(QGraphicsRectItem):
 
     def show_zeroth_orders(self):
         title = f'Zeroth-order contamination regions of {self.spec.id}'
-        data = (flag['ZERO'] & self.spec.mask) == flag['ZERO']
-        self.show_spec_layer(title, data)
+        self.show_spec_layer(title, self.spec.zeroth_mask)
 
     def show_original(self):
         title = f'{self.spec.id} before decontamination'
-        self.show_spec_layer(title, self.spec.contamination + self.spec.science)
+        self.show_spec_layer(title, self.spec.original)
 
     def show_residual(self):
         if self.model is not None:
             title = f"residual spectrum of {self.spec.id}"
-            self.show_spec_layer(title, self.spec.science - self.model)
+            self.show_spec_layer(title, self.residual)
 
     def show_model(self):
         if self.model is not None:
@@ -249,103 +340,153 @@ class SpecBox(QGraphicsRectItem):
             self.show_spec_layer(title, self.model)
 
     def show_spec_layer(self, title, data):
-        plot = PlotWindow(title)
-
-        plt.sca(plot.axis)
-        plt.imshow(data, origin='lower')
-        plt.subplots_adjust(top=0.975, bottom=0.025, left=0.025, right=0.975)
-        plt.draw()
-        plot.setWindowFlag(Qt.WindowStaysOnTopHint, False)
-        plot.show()
-
         padding = 32
 
-        display = QApplication.desktop()
-        current_screen = display.screenNumber(self.view)
-        geom = display.screenGeometry(current_screen)
+        geom = self.view.screen_geometry()
         width = geom.width() - 2 * padding
         height = geom.height() - 2 * padding
+
+        image = self._prepare_image(data, height, width)
+
+        if self._layer_window is None:
+            plot = self._reuse_plot_window('_layer_window', title)
+            self._layer_image = self._draw_image(plot.axis, image)
+        else:
+            # replace the data of the existing AxesImage, rather than clearing the axes and creating a new image
+            plot = self._layer_window
+            plot.title = title
+            plot.setWindowTitle(title)
+            plot.axis.set_title(title)
+            self._update_image(plot.axis, self._layer_image, image)
+
+        plot.fig.subplots_adjust(top=0.975, bottom=0.025, left=0.025, right=0.975)
+        plot.figure_widget.draw_idle()
+        plot.setWindowFlag(Qt.WindowStaysOnTopHint, False)
+        plot.show()
+
         plot.setGeometry(geom.left() + padding, geom.top() + padding, width, height)
-        plt.close()
 
     def show_all_layers(self):
+        if self._all_layers_window is not None:
+            # the layers of this spectrum are already plotted; show the existing window
+            self._all_layers_window.show()
+            self._all_layers_window.raise_()
+            return
+
         title = f'All Layers of {self.spec.id}'
         horizontal = self.rect().width() > self.rect().height()
-        subplot_grid_shape = (7, 1) if horizontal else (1, 7)
+        # the model and residual panels are only included if there is a model
+        n_panels = 5 if self.model is None else 7
+        subplot_grid_shape = (n_panels, 1) if horizontal else (1, n_panels)
 
-        plot = PlotWindow(title, shape=subplot_grid_shape)
-
-        plt.sca(plot.axis[0])
-        plt.imshow(self.spec.contamination + self.spec.science, origin='lower')
-        plt.title('Original')
-        plt.draw()
-
-        plt.sca(plot.axis[1])
-        plt.imshow(self.spec.contamination, origin='lower')
-        plt.title('Contamination')
-        plt.draw()
-
-        plt.sca(plot.axis[2])
-        plt.imshow(self.spec.science, origin='lower')
-        plt.title('Decontaminated')
-        plt.draw()
+        padding = 50
 
-        plt.sca(plot.axis[3])
-        if self.model is not None:
-            plt.imshow(self.model, origin='lower')
-            plt.title('Model')
-        else:
-            plt.title('N/A')
-        plt.draw()
+        geom = self.view.screen_geometry()
+        width = geom.width() - 2 * padding
+        height = geom.height() - 2 * padding
 
-        plt.sca(plot.axis[4])
-        if self.model is not None:
-            plt.imshow(self.spec.science - self.model, origin='lower')
-            plt.title('Residual')
-        else:
-            plt.title('N/A')
-        plt.draw()
+        # the number of screen pixels available to each panel
 
-        plt.sca(plot.axis[5])
-        plt.imshow(self.spec.variance, origin='lower')
-        plt.title('Variance')
-        plt.draw()
+        rows, columns = subplot_grid_shape
+        panel_height = height // rows
+        panel_width = width // columns
 
-        plt.sca(plot.axis[6])
-        data = (flag['ZERO'] & self.spec.mask) == flag['ZERO']
-        plt.imshow(data, origin='lower')
-        plt.title('Zeroth Orders')
-        plt.draw()
+        plot = PlotWindow(title, shape=subplot_grid_shape)
+        self._keep_plot_window('_all_layers_window', plot)
 
         if horizontal:
-            plt.subplots_adjust(top=0.97, bottom=0.025, left=0.025, right=0.975, hspace=0, wspace=0)
+            plot.fig.subplots_adjust(top=0.97, bottom=0.025, left=0.025, right=0.975, hspace=0, wspace=0)
         else:
-            plt.subplots_adjust(top=0.9, bottom=0.03, left=0.025, right=0.975, hspace=0, wspace=0)
+            plot.fig.subplots_adjust(top=0.9, bottom=0.03, left=0.025, right=0.975, hspace=0, wspace=0)
 
-        plt.draw()
         plot.setWindowFlag(Qt.WindowStaysOnTopHint, False)
         plot.show()
 
-        padding = 50
-
-        display = QApplication.desktop()
-        current_screen = display.screenNumber(self.view)
-        geom = display.screenGeometry(current_screen)
-        width = geom.width() - 2 * padding
-        height = geom.height() - 2 * padding
         plot.setGeometry(geom.left() + padding, geom.top() + padding, width, height)
-        plt.close()
 
-    def show_contaminant_table(self):
-        contents = self.spec.contaminants
-        rows = len(contents)
-        columns = 2
+        # prepare the images on a worker thread, so that the GUI remains responsive; they are drawn when they are ready
+
+        # the residual is also computed by the worker, unless it is already known
+
+        spec = self.spec
+        model = self.model
+
+        worker = LayerWorker(spec, model, self._residual, panel_height, panel_width)
+        worker.signals.finished.connect(lambda result: self._draw_all_layers(plot, spec, model, *result))
+        QThreadPool.globalInstance().start(worker)
+
+    def _draw_all_layers(self, plot, spec, model, images, residual):
+        """
+        Draws the `images` prepared by a LayerWorker in the panels of `plot`. The `residual` of `spec` and `model`,
+        computed by the worker, is kept for `self.residual`, unless the spectrum or the model has been replaced.
+        """
+        if self._residual is None and spec is self._spec and model is self._model:
+            self._residual = residual
+
+        if plot is not self._all_layers_window:
+            # the window was closed (or replaced) before the images were ready
+            return
+
+        for axis, (layer_title, image) in zip(plot.axis, images):
+            self._draw_image(axis, image)
+            axis.set_title(layer_title)
+
+        # render all of the panels in a single pass, once control returns to the event loop
+        plot.figure_widget.draw_idle()
+
+    @staticmethod
+    def _prepare_image(data, height, width):
+        """
+        Downsamples `data` to fit in the `height` x `width` screen area and determines its display limits. This does not
+        touch Matplotlib, so it is safe to call from a worker thread.
+
+        :return: a tuple, (reduced, extent, vmin, vmax), which can be passed to `_draw_image()`
+        """
+        vmin, vmax = utils.display_limits(data)
+        reduced, (block_rows, block_columns) = utils.downsample(data, height, width)
+        rows, columns = reduced.shape
+        extent = (-0.5, columns * block_columns - 0.5, -0.5, rows * block_rows - 0.5)
+
+        return reduced, extent, vmin, vmax
+
+    @staticmethod
+    def _draw_image(axis, image):
+        """
+        Displays an `image` produced by `_prepare_image()` in `axis`. The image is drawn without interpolation, with
+        explicit color limits and axis limits, so that Matplotlib does not need to resample the image or to autoscale
+        the axes. This must be called from the GUI thread.
+        """
+        reduced, extent, vmin, vmax = image
+        left, right, bottom, top = extent
+
+        axis.set_autoscale_on(False)
+        axis.set_xlim(left, right)
+        axis.set_ylim(bottom, top)
+
+        return axis.imshow(reduced, origin='lower', extent=extent, interpolation='nearest', vmin=vmin, vmax=vmax)
+
+    @staticmethod
+    def _update_image(axis, axes_image, image):
+        """
+        Replaces the contents of `axes_image`, an AxesImage in `axis` that was created by `_draw_image()`, with an
+        `image` produced by `_prepare_image()`. This must be called from the GUI thread.
+        """
+        reduced, extent, vmin, vmax = image
+        left, right, bottom, top = extent
 
-        self._contam_table = SpecTable(self.view, rows, columns)
+        axes_image.set_data(reduced)
+        axes_image.set_extent(extent)
+        axes_image.set_clim(vmin, vmax)
+
+        axis.set_xlim(left, right)
+        axis.set_ylim(bottom, top)
+
+    def show_contaminant_table(self):
+        self._contam_table = SpecTable(self.view)
         self._contam_table.setWindowTitle('Contaminants')
         self._contam_table.setWindowFlag(Qt.WindowStaysOnTopHint, True)
         self._contam_table.setWindowFlag(Qt.Window, True)
-        self._contam_table.add_spectra(contents)
+        self._contam_table.set_contents(self.spec.contaminants)
         self._contam_table.show()
 
     def open_analysis_tab(self):
@@ -357,28 +498,45 @@ class SpecBox(QGraphicsRectItem):
         view_tab = self.view.view_tab
         inspector = view_tab.inspector
 
-        # make a list of all open detectors (detectors currently being viewed in tabs)
+        # make a set of all open detectors (detectors currently being viewed in tabs)
+
+        n_tabs = inspector.tabs.count()
 
-        open_detectors = []
+        open_detectors = set()
 
-        for tab_index in range(inspector.tabs.count()):
+        for tab_index in range(n_tabs):
             tab = inspector.tabs.widget(tab_index)
-            if isinstance(tab, type(view_tab)):
-                open_detectors.append((tab.current_dither, tab.current_detector))
+            if getattr(tab, 'IS_VIEW_TAB', False):
+                open_detectors.add((tab.current_dither, tab.current_detector))
 
-        # open new tabs, where necessary
+        # determine which detectors need new tabs
 
-        for dither in inspector.get_object_dithers(self.spec.id):
-            for detector in inspector.get_object_detectors(dither, self.spec.id):
-                if (dither, detector) not in open_detectors:
-                    inspector.new_view_tab(dither, detector)
+        new_detectors = [(dither, detector)
+                         for dither in inspector.get_object_dithers(self.spec.id)
+                         for detector in inspector.get_object_detectors(dither, self.spec.id)
+                         if (dither, detector) not in open_detectors]
 
-        # pin the object in all tabs:
+        # open the new tabs and pin the object in all tabs, with the window updates and the tab signals suspended, so
+        # that the main window is only laid out and repainted once
 
-        for tab_index in range(inspector.tabs.count()):
-            tab = inspector.tabs.widget(tab_index)
-            if isinstance(tab, type(view_tab)):
-                tab.select_spectrum_by_id(self.spec.id)
+        inspector.main.setUpdatesEnabled(False)
+        inspector.tabs.blockSignals(True)
+
+        try:
+            for dither, detector in new_detectors:
+                inspector.new_view_tab(dither, detector)
+
+            for tab_index in range(inspector.tabs.count()):
+                tab = inspector.tabs.widget(tab_index)
+                if getattr(tab, 'IS_VIEW_TAB', False):
+                    tab.select_spectrum_by_id(self.spec.id)
+        finally:
+            inspector.tabs.blockSignals(False)
+            inspector.main.setUpdatesEnabled(True)
+
+        # the currentChanged signals were blocked, so notify the inspector of the current tab once
+        inspector.change_detector(inspector.tabs.currentIndex())
+        inspector.main.update()
 
     def show_info(self):
 
@@ -395,3 +553,52 @@ class SpecBox(QGraphicsRectItem):
                             "Location tables containing the requested information must be loaded before showing info.",
                             QMessageBox.NoButton)
             m.exec()
+
+
+class LayerSignals(QObject):
+    """
+    The signals of a LayerWorker. A QRunnable is not a QObject, so it cannot have signals of its own.
+    """
+    finished = pyqtSignal(object)
+
+
+class LayerWorker(QRunnable):
+    """
+    Prepares the images displayed by `SpecBox.show_all_layers()` on a thread from a QThreadPool. Only the NumPy work
+    (computing the derived layers, downsampling, and finding the display limits) is done here; Matplotlib figures may
+    only be drawn on the GUI thread, so the results are sent back via `signals.finished`, as a tuple of (images,
+    residual), where `images` is a list of (title, image) tuples. The model and residual layers are omitted, and the
+    residual is None, if `model` is None. The residual is computed here, unless it is provided.
+    """
+
+    def __init__(self, spec, model, residual, height, width):
+        super().__init__()
+        self.signals = LayerSignals()
+        self._spec = spec
+        self._model = model
+        self._residual = residual
+        self._height = height
+        self._width = width
+
+    def run(self):
+        spec = self._spec
+        model = self._model
+        residual = self._residual
+
+        if residual is None and model is not None:
+            residual = spec.science - model
+
+        layers = [('Original', spec.original),
+                  ('Contamination', spec.contamination),
+                  ('Decontaminated', spec.science)]
+
+        if model is not None:
+            layers += [('Model', model),
+                       ('Residual', residual)]
+
+        layers += [('Variance', spec.variance),
+                   ('Zeroth Orders', spec.zeroth_mask)]
+
+        images = [(title, SpecBox._prepare_image(data, self._height, self._width)) for title, data in layers]
+
+        self.signals.finished.emit((images, residual))
@@ -1,6 +1,8 @@
 # Python syntax highlighter adapted from https://wiki.python.org/moin/PyQt/Python%20syntax%20highlighting
 
-from PyQt5.QtCore import QRegExp
+import re
+from itertools import accumulate
+
 from PyQt5.QtGui import QColor, QTextCharFormat, QFont, QSyntaxHighlighter
 
 
@@ -39,65 +41,89 @@ class PythonHighlighter(QSyntaxHighlighter):
                 'raise', 'return', 'try', 'while', 'yield',
                 'None', 'True', 'False']
 
-    operators = ['=', '==', '!=', '<', '<=', '>', '>=',
-                 '\+', '-', '\*', '/', '//', '\%', '\*\*',
-                 '\+=', '-=', '\*=', '/=', '\%=',
-                '\^', '\|', '\&', '\~', '>>', '<<']
+    builtin_vars = ['self', 'fig', 'axis', 'np', 'Out']
+
+    operators = ['!=', '[-=<>+*/%^|&~]']
 
-    braces = ['\{', '\}', '\(', '\)', '\[', '\]']
+    braces = [r'\{', r'\}', r'\(', r'\)', r'\[', r'\]']
 
     def __init__(self, document):
 
         super().__init__(document)
 
-        self.tri_single = (QRegExp("'''"), 1, STYLES['string2'])
-        self.tri_double = (QRegExp('"""'), 2, STYLES['string2'])
+        self._offsets = None  # maps positions in code points to UTF-16 positions; see self.highlightBlock()
+
+        # the triple-quote delimiters are plain strings, which are located with str.find()
+        self.tri_single = ("'''", 1, STYLES['string2'])
+        self.tri_double = ('"""', 2, STYLES['string2'])
+
+        # Each rule is (pattern, group, format, triggers). A match of the pattern must contain at least one of the
+        # characters in `triggers`, so the rule is skipped for blocks that contain none of them; None means that the
+        # rule is always applied.
 
         rules = []
 
-        # Keyword, operator, and brace rules
-        rules += [(r'\b%s\b' % w, 0, STYLES['keyword']) for w in PythonHighlighter.keywords]
-        rules += [(r'%s' % o, 0, STYLES['operator']) for o in PythonHighlighter.operators]
-        rules += [(r'%s' % b, 0, STYLES['brace']) for b in PythonHighlighter.braces]
+        # Keyword and built-in variable rule: a single alternation of all of the words, with the format looked up from
+        # the matched word
+        word_formats = {w: STYLES['keyword'] for w in PythonHighlighter.keywords}
+        word_formats.update({w: STYLES['builtin_var'] for w in PythonHighlighter.builtin_vars})
+
+        rules += [(r'\b(?:%s)\b' % '|'.join(word_formats), 0, word_formats, None)]
+
+        # Operator and brace rules. Every operator has the same format, so the multi-character operators only need to
+        # be listed if they are not made up of single-character operators.
+        rules += [(r'|'.join(PythonHighlighter.operators), 0, STYLES['operator'], '-=<>+*/%^|&~'),
+                  (r'[%s]' % ''.join(PythonHighlighter.braces), 0, STYLES['brace'], '{}()[]')]
 
-        # All other rules
-        rules += [(r'\bself\b', 0, STYLES['builtin_var']),
-                  (r'\bfig\b', 0, STYLES['builtin_var']),
-                  (r'\baxis\b', 0, STYLES['builtin_var']),
-                  (r'\bnp\b', 0, STYLES['builtin_var']),
-                  (r'\bOut\b', 0, STYLES['builtin_var']),
+        digits = '0123456789'
 
-                  # Double-quoted string, possibly containing escape sequences
-                  (r'"[^"\\]*(\\.[^"\\]*)*"', 0, STYLES['string']),
+        # Double-quoted string, possibly containing escape sequences
+        rules += [(r'"[^"\\]*(\\.[^"\\]*)*"', 0, STYLES['string'], '"'),
                   # Single-quoted string, possibly containing escape sequences
-                  (r"'[^'\\]*(\\.[^'\\]*)*'", 0, STYLES['string']),
+                  (r"'[^'\\]*(\\.[^'\\]*)*'", 0, STYLES['string'], "'"),
 
                   # 'def' followed by an identifier
-                  (r'\bdef\b\s*(\w+)', 1, STYLES['defclass']),
+                  (r'\bdef\b\s*(\w+)', 1, STYLES['defclass'], None),
                   # 'class' followed by an identifier
-                  (r'\bclass\b\s*(\w+)', 1, STYLES['defclass']),
+                  (r'\bclass\b\s*(\w+)', 1, STYLES['defclass'], None),
 
                   # From '#' until a newline
-                  (r'#[^\n]*', 0, STYLES['comment']),
+                  (r'#[^\n]*', 0, STYLES['comment'], '#'),
 
                   # Numeric literals
-                  (r'\b[+-]?[0-9]+[lL]?\b', 0, STYLES['numbers']),
-                  (r'\b[+-]?0[xX][0-9A-Fa-f]+[lL]?\b', 0, STYLES['numbers']),
-                  (r'\b[+-]?[0-9]+(?:\.[0-9]+)?(?:[eE][+-]?[0-9]+)?\b', 0, STYLES['numbers'])]
+                  (r'\b[+-]?[0-9]+[lL]?\b', 0, STYLES['numbers'], digits),
+                  (r'\b[+-]?0[xX][0-9A-Fa-f]+[lL]?\b', 0, STYLES['numbers'], digits),
+                  (r'\b[+-]?[0-9]+(?:\.[0-9]+)?(?:[eE][+-]?[0-9]+)?\b', 0, STYLES['numbers'], digits)]
 
-        self.rules = [(QRegExp(pat), index, fmt) for (pat, index, fmt) in rules]
+        self.rules = [(re.compile(pat), index, fmt, None if triggers is None else frozenset(triggers))
+                      for (pat, index, fmt, triggers) in rules]
 
     def highlightBlock(self, text):
-        # Do other syntax formatting
-        for expression, nth, textformat in self.rules:
-            index = expression.indexIn(text, 0)
+        characters = set(text)
+
+        # setFormat() takes positions in UTF-16 code units, while `re` and str.find() report positions in code points.
+        # They differ after any character outside the Basic Multilingual Plane, in which case the positions are mapped.
+        if len(text.encode('utf-16-le')) // 2 != len(text):
+            self._offsets = list(accumulate((2 if ord(c) > 0xFFFF else 1 for c in text), initial=0))
+        else:
+            self._offsets = None
 
-            while index >= 0:
-                # We actually want the index of the nth match
-                index = expression.pos(nth)
-                length = len(expression.cap(nth))
-                self.setFormat(index, length, textformat)
-                index = expression.indexIn(text, index + length)
+        # Do other syntax formatting
+        for expression, nth, textformat, triggers in self.rules:
+            if triggers is not None and characters.isdisjoint(triggers):
+                # no match is possible in this block
+                continue
+
+            for match in expression.finditer(text):
+                # We actually want the span of the nth group
+                start, end = match.span(nth)
+                if end <= start:
+                    # the group did not take part in the match (the span is (-1, -1)), or it matched an empty string
+                    continue
+                if isinstance(textformat, dict):
+                    self._set_format(start, end, textformat[match.group(nth)])
+                else:
+                    self._set_format(start, end, textformat)
 
         self.setCurrentBlockState(0)
 
@@ -106,6 +132,16 @@ class PythonHighlighter(QSyntaxHighlighter):
         if not in_multiline:
             in_multiline = self.match_multiline(text, *self.tri_double)
 
+    def _set_format(self, start, end, textformat):
+        """
+        Applies `textformat` to the characters from `start` to `end`, which are positions in code points.
+        """
+        if self._offsets is not None:
+            last = len(self._offsets) - 1
+            start, end = self._offsets[min(start, last)], self._offsets[min(end, last)]
+
+        self.setFormat(start, end - start, textformat)
+
     def match_multiline(self, text, delimiter, in_state, style):
         # If inside triple-single quotes, start at 0
         if self.previousBlockState() == in_state:
@@ -113,26 +149,26 @@ class PythonHighlighter(QSyntaxHighlighter):
             add = 0
         # Otherwise, look for the delimiter on this line
         else:
-            start = delimiter.indexIn(text)
+            start = text.find(delimiter)
             # Move past this match
-            add = delimiter.matchedLength()
+            add = len(delimiter)
 
         # As long as there's a delimiter match on this line...
         while start >= 0:
             # Look for the ending delimiter
-            end = delimiter.indexIn(text, start + add)
+            end = text.find(delimiter, start + add)
             # Ending delimiter on this line?
             if end >= add:
-                length = end - start + add + delimiter.matchedLength()
+                length = end - start + add + len(delimiter)
                 self.setCurrentBlockState(0)
             # No; multi-line string
             else:
                 self.setCurrentBlockState(in_state)
                 length = len(text) - start + add
             # Apply formatting
-            self.setFormat(start, length, style)
+            self._set_format(start, start + length, style)
             # Look for the next match
-            start = delimiter.indexIn(text, start + length)
+            start = text.find(delimiter, start + length)
 
         # Return True if still inside a multi-line string, False otherwise
         if self.currentBlockState() == in_state:
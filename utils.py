@@ -1,6 +1,6 @@
-from scipy.integrate import simps
-from scipy.signal import medfilt
-from math import erf, sqrt
+from scipy.integrate import simpson
+from scipy.ndimage import median_filter, uniform_filter1d
+from scipy.special import erf
 import numpy as np
 
 from PyQt5.QtGui import QImage, QPixmap
@@ -56,8 +56,8 @@ def effective_wavelength(transmission, wavs):
     :param wavs: The wavelengths corresponding to the transmission values.
     :return: The weighted average wavelength of the filter (the effective wavelength).
     """
-    weighted_wav = simps(transmission * wavs, wavs)
-    total_weight = simps(transmission, wavs)
+    weighted_wav = simpson(transmission * wavs, x=wavs)
+    total_weight = simpson(transmission, x=wavs)
     return weighted_wav / total_weight
 
 
@@ -83,7 +83,7 @@ def convolve_filter(wavelengths, fluxes, filter_wavs, filter_transmissions):
     """
     integrand = interp_multiply(filter_wavs, filter_transmissions, wavelengths, fluxes)
 
-    return simps(integrand, filter_wavs) / simps(filter_transmissions, filter_wavs)
+    return simpson(integrand, x=filter_wavs) / simpson(filter_transmissions, x=filter_wavs)
 
 
 def smooth_signal(signal, window_width):
@@ -91,10 +91,9 @@ def smooth_signal(signal, window_width):
     Performs a smothing operation on an input signal by computing the moving average in a region of width equal
      to `window_width`.
     """
-    window = np.ones(window_width)
-    window = window / window.sum()
-
-    return np.convolve(signal, window, mode='same')
+    # a running sum, which costs the same regardless of the width of the window. The signal is zero-padded, as it was
+    # when this was computed with np.convolve(..., mode='same').
+    return uniform_filter1d(np.asarray(signal, dtype=np.float64), window_width, mode='constant')
 
 
 def find_spikes(signal, spike_width, noise_sigma, padding):
@@ -135,7 +134,9 @@ def find_spikes(signal, spike_width, noise_sigma, padding):
 
     kernel_size = width + 1 if width % 2 == 0 else width
 
-    smoothed_signal = medfilt(signal, kernel_size)
+    # (mode='constant' pads the signal with zeros, as scipy.signal.medfilt did)
+
+    smoothed_signal = median_filter(signal, size=kernel_size, mode='constant')
 
     # identify regions in which the signal exceeds the the smoothed signal by 3 sigma
 
@@ -148,38 +149,36 @@ def find_spikes(signal, spike_width, noise_sigma, padding):
     if len(spike_indices) == 0:
         return np.array([])
 
-    indices = set()
+    if padding < 1:
+        return np.array([])
+
+    # mark the spike centers and dilate them: sample i is included if a spike center lies in (i - padding, i + padding]
+
+    n_samples = len(signal)
+
+    centers = np.zeros(n_samples)
+    centers[spike_indices] = 1.0
+
+    included = np.convolve(centers, np.ones(2 * padding))[padding:padding + n_samples] > 0.5
+
+    # exclude the samples near the ends of the signal
 
     imin = spike_width + 1
-    imax = len(signal) - spike_width
+    imax = n_samples - spike_width
 
-    for idx in spike_indices:
-        ileft = max(imin, idx - padding)
-        iright = min(imax, idx + padding)
-        for i in range(ileft, iright):
-            indices.add(i)
+    included[:imin] = False
+    included[max(imax, 0):] = False
 
-    return np.array(list(indices))
+    return np.flatnonzero(included)
 
 
 def cdf(x, mu, sigma):
     """
     The Gaussian cumulative distribution function.
 
-    Computes the integral of the Gaussian distribution centered at mu and with sigma, from negative infinity to x"""
-    return 0.5 * (1.0 + erf((x - mu) / (sqrt(2) * sigma)))
-
-
-def prob_in_range(lower, upper, mu, sigma):
-    """
-    Computes the probability between x = lower and x = upper of the Gaussian, centered at x = mu.
-    :param lower: The lower limit of the integral.
-    :param upper: The upper limit of the integral
-    :param mu: The mean (central) position of the Gaussian distribution
-    :param sigma: The standard deviation of the Gaussian distribution
-    :return: The integral of the Gaussian distribution between x = lower to x = upper.
-    """
-    return cdf(upper, mu, sigma) - cdf(lower, mu, sigma)
+    Computes the integral of the Gaussian distribution centered at mu and with sigma, from negative infinity to x. `x`
+    may be a NumPy array, in which case the function is evaluated element-wise."""
+    return 0.5 * (1.0 + erf((x - mu) / (np.sqrt(2) * sigma)))
 
 
 def gauss_kernel(canvas, center, sigma):
@@ -192,7 +191,7 @@ def gauss_kernel(canvas, center, sigma):
     """
     y_res, x_res = canvas.shape
 
-    if y_res != y_res:
+    if y_res != x_res:
         raise ValueError("The image must be square.")
 
     res = x_res
@@ -207,30 +206,81 @@ def gauss_kernel(canvas, center, sigma):
     if semiminor_axis > semimajor_axis:
         raise ValueError("The semi-major axis must equal to or larger than that the semi-minor axis.")
 
-    # compute the total mass in each row of the array
+    # the Gaussian is separable, so each pixel is the product of the mass in its row and the mass in its column. The
+    # masses are the differences between the values of the CDF at the pixel edges.
+
+    edges = np.arange(res + 1, dtype=np.float64)
 
-    row_sum = np.zeros(res)
+    # compute the total mass in each row of the array
 
-    for j in range(res):
-        row_sum[j] = prob_in_range(j, j + 1.0, center_y, semiminor_axis)
+    row_sum = np.diff(cdf(edges, center_y, semiminor_axis))
 
     # compute the 1D kernel that will be used for distributing the light along the major axis
 
-    row_kernel = np.zeros(res)
-
-    for i in range(res):
-        row_kernel[i] = prob_in_range(i, i + 1.0, center_x, semimajor_axis)
+    row_kernel = np.diff(cdf(edges, center_x, semimajor_axis))
 
-    # compute the value of each pixel:
+    # compute the value of each pixel; the outer product is written directly into the canvas, without a temporary array
+    # (the unsafe casting allows integer canvases, as the assignment to canvas[...] did):
 
-    for j in range(res):
-        row = canvas[j]
-        for i in range(res):
-            row[i] = row_kernel[i] * row_sum[j]
+    np.multiply(row_sum[:, np.newaxis], row_kernel[np.newaxis, :], out=canvas, casting='unsafe')
 
     return canvas
 
 
+def downsample(image, max_height, max_width):
+    """
+    Reduces the resolution of a 2D image, by averaging blocks of pixels, so that it has no more than `max_height` rows
+    and `max_width` columns. Images that are already small enough are returned unchanged.
+    :param image: A 2D NumPy array.
+    :param max_height: The maximum number of rows in the output image.
+    :param max_width: The maximum number of columns in the output image.
+    :return: The downsampled image and the block size (rows, columns) used for averaging.
+    """
+    height, width = image.shape
+
+    if max_height < 1 or max_width < 1:
+        return image, (1, 1)
+
+    block_rows = -(-height // max_height)  # ceil(height / max_height)
+    block_columns = -(-width // max_width)
+
+    if block_rows == 1 and block_columns == 1:
+        return image, (1, 1)
+
+    # trim the image so that it consists of a whole number of blocks, then average each block
+
+    rows = height // block_rows
+    columns = width // block_columns
+
+    blocks = image[:rows * block_rows, :columns * block_columns].reshape(rows, block_rows, columns, block_columns)
+
+    return blocks.mean(axis=(1, 3)), (block_rows, block_columns)
+
+
+def display_limits(image, lower=1.0, upper=99.0, n_samples=10000):
+    """
+    Estimates the limits of the color scale to use when displaying an image, as the `lower` and `upper` percentiles of
+    the pixel values. The percentiles are computed from an evenly-spaced sample of about `n_samples` pixels. If the
+    two percentiles are equal, the minimum and maximum values of the image are used instead.
+    :param image: A NumPy array (boolean arrays are displayed using the limits 0 and 1).
+    :param lower: The percentile used as the lower limit.
+    :param upper: The percentile used as the upper limit.
+    :param n_samples: The approximate number of pixels used for estimating the percentiles.
+    :return: The limits (vmin, vmax).
+    """
+    if image.dtype == bool:
+        return 0, 1
+
+    step = max(1, image.size // n_samples)
+
+    vmin, vmax = np.nanpercentile(image.ravel()[::step], [lower, upper])
+
+    if not vmin < vmax:
+        vmin, vmax = np.nanmin(image), np.nanmax(image)
+
+    return vmin, vmax
+
+
 def verify_2d_numpy_array(arg):
     """
     Checks whether the argument, `arg`, is a 2-dimensional NumPy array.
@@ -242,127 +292,141 @@ def verify_2d_numpy_array(arg):
         raise TypeError(f"Expected a 2-dimensional NumPy array. Encountered type {type(arg)}.")
 
 
-def bounding_indices(box1, box2):
+def apply_contaminants(contaminant_fluxes, total_contamination):
     """
-    Computes the bounding indices of the region of overlap of two boxes_visible.
-    box1: A tuple of (left, bottom, width, height)
-    box2: A tuple of (left, bottom, width, height)
-    Returns: two tuples: (left1, bottom1, right1, top1), (left2, bottom2, right2, top2) which are the bounding
-    indices of the area of overlap in the coordinate system of box1 and the coordinate system of box2, respectively.
+    Adds the contaminant_flux due to several contaminants to a canvas. The regions of overlap with the canvas are
+    computed for all of the contaminants at once.
+    contaminant_fluxes: a sequence of (offset, 2D array) tuples, where each offset is a tuple of (left, bottom)
+    specifying the position of the lower-left pixel of the array within the detector and each 2D array contains the
+    model spectrum of a contaminant.
+    total_contamination: a tuple of (offset, 2D array), where the offset is a tuple of (left, bottom) specifying the
+    position of the lower-left pixel of the array within the detector and the 2D array contains the accumulated
+    contaminant_flux.
     """
+    if len(contaminant_fluxes) == 0:
+        return
 
-    left1, bottom1, width1, height1 = box1
-    left2, bottom2, width2, height2 = box2
+    (canvas_left, canvas_bottom), canvas = total_contamination
+    canvas_height, canvas_width = canvas.shape
 
-    # the offset between the corners of the two boxes_visible is:
+    offsets = np.array([offset for offset, _ in contaminant_fluxes], dtype=np.int64)
+    shapes = np.array([contam.shape for _, contam in contaminant_fluxes], dtype=np.int64)
 
-    x_offset = left1 - left2
-    y_offset = bottom1 - bottom2
+    # the positions of the lower-left corners of the contaminants, in the coordinate system of the canvas
 
-    # the coordinates of box1's boundaries, in the coordinate system of box2 are:
+    left = offsets[:, 0] - canvas_left
+    bottom = offsets[:, 1] - canvas_bottom
 
-    left = x_offset  # 0 + x_offset
-    bottom = y_offset  # 0 + y_offset
-    right = width1 + x_offset
-    top = height1 + y_offset
+    # the regions of overlap, in the coordinate system of the canvas
 
-    # clip the boundaries so that we are limited to the region within box2:
+    can_left = np.maximum(left, 0)
+    can_bottom = np.maximum(bottom, 0)
+    can_right = np.minimum(left + shapes[:, 1], canvas_width)
+    can_top = np.minimum(bottom + shapes[:, 0], canvas_height)
 
-    left2 = max(0, left)
-    bottom2 = max(0, bottom)
-    right2 = min(width2, right)
-    top2 = min(height2, top)
+    # the regions of overlap, in the coordinate systems of the contaminants
 
-    # the coordinates of the region of overlap, in the coordinate system of box1:
+    contam_left = can_left - left
+    contam_bottom = can_bottom - bottom
+    contam_right = can_right - left
+    contam_top = can_top - bottom
 
-    left1 = max(0, left2 - x_offset)
-    right1 = min(width1, right2 - x_offset)
-    bottom1 = max(0, bottom2 - y_offset)
-    top1 = min(height1, top2 - y_offset)
+    for i in np.flatnonzero((can_left < can_right) & (can_bottom < can_top)):
+        contam = contaminant_fluxes[i][1]
+        canvas[can_bottom[i]:can_top[i], can_left[i]:can_right[i]] += \
+            contam[contam_bottom[i]:contam_top[i], contam_left[i]:contam_right[i]]
 
-    boxes_intersect = left1 < right1 and bottom1 < top1 and left2 < right2 and bottom2 < top2
 
-    if boxes_intersect:
-        return (left1, bottom1, right1, top1), (left2, bottom2, right2, top2)
-    else:
-        # the boxes_visible do not intersect.
-        return None, None
+def add_cutouts(canvas, cutouts):
+    """
+    Adds a set of cutouts to a canvas.
+    canvas: a 2D array, which is modified in place.
+    cutouts: an iterable of (x_offset, y_offset, pixels) tuples, where the offsets are the coordinates of the
+    lower-left pixel of the 2D array `pixels` within the canvas.
+    """
+    for x_offset, y_offset, pixels in cutouts:
+        height, width = pixels.shape
+        canvas[y_offset:y_offset + height, x_offset:x_offset + width] += pixels
 
 
-def apply_contaminant(contaminant_flux, total_contamination):
+def tone_map(im, maxval=None, minval=None, parameters=None):
     """
-    Add the contaminant_flux due to a single contaminant to a canvas.
-    total_contamination: a tuple of (offset, 2D array), where the offset is a tuple of (left, bottom) specifying the
-    position of the lower-left pixel of the array within the detector and the 2D array contains the accumulated
-    contaminant_flux.
-    contaminant_flux: a tuple of (offset, 2D array), where the offset is a tuple of (left, bottom) specifying the
-    position of the lower-left pixel of the array within the detector and the 2D array contains the model spectrum
-    of a contaminant.
+    Scales the input image to fit the dynamic range between 0 and 255, inclusive.
+    :param im: A 2D NumPy array.
+    :param maxval: The value that is treated as the maximum of the image; by default, the maximum of `im`.
+    :param minval: The value that is treated as the minimum of the image; by default, the minimum of `im`.
+    :param parameters: The parameters returned by a previous call. If these are provided, then `maxval` and `minval`
+        are ignored and the image is scaled in exactly the same way as the image of that call, without computing the
+        histograms of the image.
+    :return: The scaled image, as a C-contiguous uint8 array, and the parameters of the scaling.
     """
+    if parameters is None:
+        if maxval is None:
+            maxval = im.max()
 
-    (contam_left, contam_bottom), contam = contaminant_flux
-    (canvas_left, canvas_bottom), canvas = total_contamination
+        if minval is None:
+            minval = im.min()
+    else:
+        minval, maxval, gain, shift, scale_factor2 = parameters
 
-    contam_height, contam_width = contam.shape
-    canvas_height, canvas_width = canvas.shape
+    # the image is processed in a single float32 buffer, which is modified in place at each step
 
-    contam_box = (contam_left, contam_bottom, contam_width, contam_height)
-    canvas_box = (canvas_left, canvas_bottom, canvas_width, canvas_height)
+    scaled = np.subtract(im, minval, dtype=np.float32)
+    scaled /= np.float32(maxval - minval)
 
-    contam_boundaries, canvas_boundaries = bounding_indices(contam_box, canvas_box)
+    if parameters is None:
+        counts, bins = np.histogram(scaled, bins=300)
+        scale_factor = 0.017 / bins[1 + counts.argmax()]
+        gain = 2 * 350 * scale_factor / np.pi
 
-    if contam_boundaries is None or canvas_boundaries is None:
-        # the contaminant does not intersect the canvas
-        return
+    # computes gain * arctan(1.1e6 * normalized / maxval), in place
+    scaled *= np.float32(1.1e6 / maxval)
+    np.arctan(scaled, out=scaled)
+    scaled *= np.float32(gain)
+
+    if parameters is None:
+        shift = np.float32(percentile(scaled, 0.05))
 
-    contam_left, contam_bottom, contam_right, contam_top = contam_boundaries
-    can_left, can_bottom, can_right, can_top = canvas_boundaries
+    scaled -= shift
+
+    if parameters is None:
+        counts, bins = np.histogram(scaled, bins=300, range=(0, 300))
+        scale_factor2 = np.float32(44.0 / bins[1 + counts.argmax()])
+
+    scaled *= scale_factor2
+    np.clip(scaled, 0, 255, out=scaled)
 
-    canvas[can_bottom:can_top, can_left:can_right] += contam[contam_bottom:contam_top, contam_left:contam_right]
+    return scaled.astype(np.uint8, order='C'), (minval, maxval, gain, shift, scale_factor2)
 
 
-def to_bytes(im, maxval=None, minval=None, aux_im=None):
+def percentile(a, q):
     """
-    Scales the input image to fit the dynamic range between 0 and 255, inclusive. Then returns
-    the array as an array of bytes (a string).
-    If aux_im is provided, then aux_im is scaled using the same parameters as im, even though its contents are
-    different.
+    Computes the q-th percentile of the values in the array `a`, using linear interpolation between the two nearest
+    values, like `np.percentile()`. Only the two values that are needed are located, using `np.partition()`, rather than
+    sorting the values.
+    :param a: A NumPy array.
+    :param q: The percentile, between 0 and 100.
+    :return: The q-th percentile of `a`.
     """
-    if maxval is None:
-        maxval = im.max()
+    values = np.ravel(a)
+    position = (values.size - 1) * q / 100.0
+    lower = int(position)
+    upper = min(lower + 1, values.size - 1)
 
-    if minval is None:
-        minval = im.min()
+    partitioned = np.partition(values, (lower, upper))
 
-    data = (im - minval) / (maxval - minval)
-    counts, bins = np.histogram(data.flatten(), bins=300)
-    scale_factor = 0.017 / bins[1 + counts.argmax()]
-    scaled = 2 * 350 * scale_factor * (np.arctan(1.1e6 * data.astype(np.float32) / maxval) / np.pi)
-    shift = np.percentile(scaled, 0.05)
-    scaled -= shift
-    counts, bins = np.histogram(scaled.flatten(), bins=300, range=(0, 300))
-    scale_factor2 = 44.0 / bins[1 + counts.argmax()]
-    scaled *= scale_factor2
-    clipped = np.clip(scaled, 0, 255)
-    if aux_im is not None:
-        aux_data = (aux_im - minval) / (maxval - minval)
-        scaled_aux = 2 * 350 * scale_factor * (np.arctan(1.1e6 * aux_data.astype(np.float32) / maxval) / np.pi)
-        scaled_aux -= shift
-        scaled_aux *= scale_factor2
-        aux_clipped = np.clip(scaled_aux, 0, 255)
-        aux_bytes = aux_clipped.astype(np.uint8).flatten().tobytes()
-    else:
-        aux_bytes = None
-    return clipped.astype(np.uint8).flatten().tobytes(), aux_bytes
+    fraction = position - lower
 
+    return partitioned[lower] + (partitioned[upper] - partitioned[lower]) * fraction
 
-def np_to_pixmap(array, maxval=None, minval=None, aux_array=None):
-    height, width = array.shape
-    image_bytes, aux_bytes = to_bytes(array, maxval, minval, aux_array)
-    image = QImage(image_bytes, width, height, width, QImage.Format_Grayscale8)
-    if aux_array is not None:
-        aux_image = QImage(aux_bytes, width, height, width, QImage.Format_Grayscale8)
-        return QPixmap(image), QPixmap(aux_image)
-    else:
-        return QPixmap(image), None
+
+def grayscale_to_pixmap(pixels):
+    """
+    Converts a 2D uint8 array, such as those returned by `tone_map()`, into a grayscale QPixmap.
+    """
+    height, width = pixels.shape
+    # the QImage wraps the buffer of the array, rather than a copy of it. This is safe because QPixmap copies the pixels
+    # while the array is still referenced here.
+    image = QImage(pixels.data, width, height, pixels.strides[0], QImage.Format_Grayscale8)
+    return QPixmap(image)
 
@@ -1,15 +1,16 @@
 import os
-import inspect
+from collections import OrderedDict
 
 import numpy as np
 
-from PyQt5.QtCore import Qt, QPointF
+from PyQt5.QtCore import Qt, QPointF, QObject, QRunnable, QThreadPool, QTimer, pyqtSignal
 from PyQt5.QtGui import QBrush, QColor, QImage, QPixmap
 from PyQt5.QtWidgets import (QGraphicsScene, QWidget, QComboBox, QHBoxLayout, QLabel,
                              QLineEdit, QVBoxLayout, QSpacerItem, QSizePolicy)
 
 from specbox import SpecBox
 from detector_view import View
+from layer_cache import LayerCache
 import utils
 
 
@@ -78,6 +79,16 @@ class ViewTab(QWidget):
 
     LAYERS = ('original', 'model', 'decontaminated residual', 'model residual')
 
+    LAYER_INDEX = {layer: index for index, layer in enumerate(LAYERS)}  # the index of each layer in the data selector
+
+    IS_VIEW_TAB = True  # allows modules that cannot import ViewTab (see specbox.py) to identify ViewTab instances
+
+    max_cached_layer_images = 8  # the number of model and residual images that are kept in memory
+
+    max_cached_layer_pixmaps = 8  # the number of model and residual pixmaps that are kept in memory
+
+    _blank_pixmap = None  # shared by all of the tabs; see ViewTab.blank_pixmap()
+
     def __init__(self, inspector, *args):
 
         super().__init__(*args)
@@ -88,12 +99,24 @@ class ViewTab(QWidget):
         self.current_dither = 1
         self.boxes_visible = False
 
-        self.pixmap_item = {}  # {dither: {detector: {layer: pixmap}}
+        # the SpecBoxes in the scene, and the subset of them that are pinned. SpecBox.pin() and SpecBox.unpin() keep
+        # the latter up to date, via self.box_pinned() and self.box_unpinned().
+        self._boxes = set()
+        self._pinned_boxes = set()
 
-        for dither in (1, 2, 3, 4):
-            self.pixmap_item[dither] = {}
-            for detector in range(1, 17):
-                self.pixmap_item[dither][detector] = {layer :None for layer in self.LAYERS}
+        # {(dither, detector): pinned SpecBoxes}, which are taken out of the scene while a different detector is
+        # displayed, and put back when the detector is displayed again. See self.update_view()
+        self._stashed_boxes = {}
+        self._boxes_key = None  # the (dither, detector) of the boxes in the scene
+
+        # {(dither, detector, layer): QPixmap} for the model and residual layers, created when a layer is first shown;
+        # the most recently used pixmap is last. The pixmaps of the detector images are cached by the Inspector.
+        self._layer_pixmaps = OrderedDict()
+
+        # {(dither, detector, layer): image}, the most recently used image is last. See self._start_layer_worker()
+        self._layer_images = OrderedDict()
+        self._pending_layers = set()  # the (dither, detector, layer) keys of the layers that are being computed
+        self._layer_generation = 0  # incremented whenever the layer images are cleared; see self._layer_image_ready()
 
         self._layout = QVBoxLayout()
 
@@ -113,13 +136,14 @@ class ViewTab(QWidget):
 
         self._background = QBrush(QColor('#56595e'))
 
-        executable_directory = os.path.dirname(os.path.abspath(inspect.stack()[0][1]))
-
-        self._blank_image = QPixmap(QImage(executable_directory + '/load-exposure-message.svg'))
+        self._blank_image = ViewTab.blank_pixmap()
 
         self.scene.setBackgroundBrush(self._background)
 
-        self._blank_pixmap = self.scene.addPixmap(self._blank_image)
+        # the detector image, or the selected layer derived from it, is displayed by this single item, whose pixmap is
+        # replaced when the detector or the layer changes
+        self._background_item = self.scene.addPixmap(self._blank_image)
+        self._background_item.setZValue(-1.0)
 
         self.view.setScene(self.scene)
 
@@ -129,6 +153,28 @@ class ViewTab(QWidget):
 
         self.current_layer = 'original'
 
+        self._selectors_initialized = False  # see self.init_view()
+
+        # searches are started by a short single-shot timer, so that repeated presses of Enter are coalesced into a
+        # single lookup
+        self._search_timer = QTimer(self)
+        self._search_timer.setSingleShot(True)
+        self._search_timer.setInterval(150)
+        self._search_timer.timeout.connect(self.select_spectrum)
+        self.selection_area.searchbox.returnPressed.connect(self._search_timer.start)
+
+    @classmethod
+    def blank_pixmap(cls):
+        """
+        Returns the pixmap that is displayed before the exposures are loaded. It is loaded when the first tab is created
+        (a QApplication must exist by then) and shared by the later tabs.
+        """
+        if cls._blank_pixmap is None:
+            directory = os.path.dirname(os.path.abspath(__file__))
+            cls._blank_pixmap = QPixmap(QImage(os.path.join(directory, 'load-exposure-message.svg')))
+
+        return cls._blank_pixmap
+
     def init_view(self):
         # display dither 1, detector 1 in single view
 
@@ -141,53 +187,116 @@ class ViewTab(QWidget):
         self.selection_area.dither_selector.setEnabled(True)
         self.selection_area.detector_selector.setEnabled(True)
 
-        for i, dither in enumerate(dithers):
+        # the dithers depend on the exposures that have been loaded, so they are replaced each time that this is called
+
+        self.selection_area.dither_selector.clear()
+
+        for dither in dithers:
             self.selection_area.dither_selector.addItem(str(dither), dither)
 
-        self.selection_area.dither_selector.activated[int].connect(self.change_dither)
+        # the detectors and layers are always the same, so they are added, and the signals are connected, only once;
+        # otherwise, re-loading the exposures would duplicate the items and the slots would be invoked more than once.
 
-        for detector in range(1, 17):
-            self.selection_area.detector_selector.addItem(str(detector), detector)
+        if not self._selectors_initialized:
+            self.selection_area.dither_selector.activated[int].connect(self.change_dither)
 
-        self.selection_area.detector_selector.activated[int].connect(self.change_detector)
+            for detector in range(1, 17):
+                self.selection_area.detector_selector.addItem(str(detector), detector)
+
+            self.selection_area.detector_selector.activated[int].connect(self.change_detector)
 
-        for layer in self.LAYERS:
-            self.selection_area.data_selector.addItem(layer)
+            self.selection_area.data_selector.addItems(self.LAYERS)
 
-        self.selection_area.data_selector.activated[str].connect(self.change_layer)
+            self.selection_area.data_selector.activated[str].connect(self.change_layer)
+
+            self._selectors_initialized = True
 
         self.boxes_visible = False
 
     def change_dither(self, dither_index):
-        self.current_dither = self.selection_area.dither_selector.itemData(dither_index)
+        dither = self.selection_area.dither_selector.itemData(dither_index)
         if dither_index != self.selection_area.dither_selector.currentIndex():
             self.selection_area.dither_selector.blockSignals(True)
             self.selection_area.dither_selector.setCurrentIndex(dither_index)
             self.selection_area.dither_selector.blockSignals(False)
+        if dither == self.current_dither:
+            # the dither is already displayed (for instance, the selected item was re-selected)
+            return
+        self.current_dither = dither
         self.update_view()
+        QTimer.singleShot(0, self.prefetch_neighbors)
 
     def change_detector(self, detector_index):
-        self.current_detector = self.selection_area.detector_selector.itemData(detector_index)
+        detector = self.selection_area.detector_selector.itemData(detector_index)
         if detector_index != self.selection_area.detector_selector.currentIndex():
             self.selection_area.detector_selector.blockSignals(True)
             self.selection_area.detector_selector.setCurrentIndex(detector_index)
             self.selection_area.detector_selector.blockSignals(False)
+        if detector == self.current_detector:
+            # the detector is already displayed (for instance, the selected item was re-selected)
+            return
+        self.current_detector = detector
         self.update_view()
+        QTimer.singleShot(0, self.prefetch_neighbors)
+
+    def prefetch_neighbors(self):
+        """
+        Prefetches the detector images that are likely to be viewed next, when browsing sequentially: the adjacent
+        detectors of the current dither, and the current detector of the adjacent dithers. Only the tab that is being
+        viewed prefetches, so that opening several tabs at once (see `SpecBox.open_all_spectra()`) does not start a
+        burst of prefetches; the Inspector calls this when a different tab is selected.
+        """
+        if self.inspector.exposures is None or self._pending_layers:
+            # the exposures are not loaded, or a layer that was selected by the user is being computed
+            return
+
+        if self.inspector.tabs.currentWidget() is not self:
+            return
+
+        dither = self.current_dither
+        detector = self.current_detector
+
+        neighbors = [(dither, neighbor) for neighbor in (detector - 1, detector + 1) if 1 <= neighbor <= 16]
+
+        dithers = sorted(self.inspector.exposures)
+
+        if dither in dithers:
+            index = dithers.index(dither)
+            neighbors += [(dithers[i], detector) for i in (index - 1, index + 1) if 0 <= i < len(dithers)]
+
+        self.inspector.prefetch_exposure_pixmaps(neighbors)
 
     def update_view(self):
         if self.current_dither is None or self.current_detector is None:
             return
 
-        data = self.inspector.exposures[self.current_dither][self.current_detector].data
+        pixmap = self.inspector.get_exposure_pixmap(self.current_dither, self.current_detector)
+
+        # the scene is not cleared: only the boxes are removed, and the pinned boxes are kept for when the detector is
+        # displayed again
+        for item in self._boxes - self._pinned_boxes:
+            self.scene.removeItem(item)
+
+        key = (self.current_dither, self.current_detector)
 
-        pixmap, _ = utils.np_to_pixmap(data, data.max())
+        if key != self._boxes_key:
+            for item in self._pinned_boxes:
+                self.scene.removeItem(item)
+
+            if self._pinned_boxes:
+                self._stashed_boxes[self._boxes_key] = self._pinned_boxes
+
+            self._pinned_boxes = self._stashed_boxes.pop(key, set())
+
+            for item in self._pinned_boxes:
+                self.scene.addItem(item)
 
-        self.scene.clear()
+            self._boxes_key = key
+
+        self._boxes = set(self._pinned_boxes)
         self.current_layer = 'original'
-        original_index = self.selection_area.data_selector.findText(self.current_layer)
-        self.selection_area.data_selector.setCurrentIndex(original_index)
-        self.pixmap_item[self.current_dither][self.current_detector][self.current_layer] = self.scene.addPixmap(pixmap)
-        self.pixmap_item[self.current_dither][self.current_detector][self.current_layer].setZValue(-1.0)
+        self.selection_area.data_selector.setCurrentIndex(ViewTab.LAYER_INDEX[self.current_layer])
+        self._background_item.setPixmap(pixmap)
 
         self.boxes_visible = False
 
@@ -228,6 +337,7 @@ class ViewTab(QWidget):
                 rect.model = model.pixels
 
             self.scene.addItem(rect)
+            self._boxes.add(rect)
 
             return rect, QPointF(left, top)
 
@@ -252,9 +362,9 @@ class ViewTab(QWidget):
         self.boxes_visible = True
 
     def remove_boxes_in_view(self):
-        for item in self.scene.items():
-            if isinstance(item, SpecBox) and not item.pinned:
-                self.scene.removeItem(item)
+        for item in self._boxes - self._pinned_boxes:
+            self.scene.removeItem(item)
+        self._boxes = set(self._pinned_boxes)
         self.boxes_visible = False
 
     def active_detector_has_spectral_data(self):
@@ -267,6 +377,9 @@ class ViewTab(QWidget):
         return dith in self.inspector.collection.get_dithers() and det in self.inspector.collection.get_detectors(dith)
 
     def select_spectrum(self):
+        if self.inspector.collection is None:
+            return
+
         object_id = self.selection_area.searchbox.text()
 
         spec = self.select_spectrum_by_id(object_id)
@@ -300,70 +413,168 @@ class ViewTab(QWidget):
         for item in self.get_pinned_spectra():
             if item.spec.id == object_id:
                 self.scene.removeItem(item)
+                self._boxes.discard(item)
+                self._pinned_boxes.discard(item)
 
     def get_pinned_spectra(self):
-        items = []
-        for item in self.scene.items():
-            if isinstance(item, SpecBox) and item.pinned:
-                items.append(item)
-        return items
-
-    def get_model_residual_image(self):
-        """removes all model contaminants from the detector and returns the model residual"""
-        data = self.inspector.exposures[self.current_dither][self.current_detector].data
-        return data - self.get_model_image()
-
-    def get_model_image(self):
-        data = self.inspector.exposures[self.current_dither][self.current_detector].data
-        sim = np.zeros_like(data)
-
-        for object_id in self.inspector.collection.get_object_ids(self.current_dither, self.current_detector):
-            model = self.inspector.collection.get_model(self.current_dither, self.current_detector, object_id, 1)
-            if model is not None:
-                height, width = model.pixels.shape
-                region = (slice(model.y_offset, model.y_offset + height), slice(model.x_offset, model.x_offset + width))
-                sim[region] += model.pixels
-            else:
-                # there is no model because this was not contaminated. The spectrum itself is essentially the model.
-                model = self.inspector.collection.get_spectrum(self.current_dither, self.current_detector, object_id)
-                height, width = model.science.shape
-                region = (slice(model.y_offset, model.y_offset + height), slice(model.x_offset, model.x_offset + width))
-                sim[region] += model.science
+        return list(self._pinned_boxes)
 
-        return sim
+    def box_pinned(self, box):
+        """Called by `SpecBox.pin()`."""
+        self._pinned_boxes.add(box)
 
-    def get_residual_image(self):
-        data = self.inspector.exposures[self.current_dither][self.current_detector].data
-        decon = np.zeros_like(data)
+    def box_unpinned(self, box):
+        """Called by `SpecBox.unpin()`."""
+        self._pinned_boxes.discard(box)
 
-        for object_id in self.inspector.collection.get_object_ids(self.current_dither, self.current_detector):
-            spec = self.inspector.collection.get_spectrum(self.current_dither, self.current_detector, object_id)
-            height, width = spec.science.shape
-            region = (slice(spec.y_offset, spec.y_offset + height), slice(spec.x_offset, spec.x_offset + width))
-            decon[region] += spec.science
+    def get_layer_inputs(self, dither=None, detector=None):
+        """
+        Returns the inputs of `compute_layer_image()` for the specified detector: a tuple of (data, spectra, models),
+        where `data` is the detector image, and `spectra` and `models` are the cutouts (see
+        `DecontaminatedSpectraCollection.get_cutouts()`) of the decontaminated science layers and of the first-order
+        models.
+        """
+        dither = self.current_dither if dither is None else dither
+        detector = self.current_detector if detector is None else detector
+
+        data = self.inspector.exposures[dither][detector].data
+
+        collection = self.inspector.collection
+        spectra = collection.get_cutouts(dither, detector)
+        models = collection.get_cutouts(dither, detector, order=1)
+
+        return data, spectra, models
+
+    @staticmethod
+    def compute_layer_image(layer, data, spectra, models, model_image=None):
+        """
+        Computes the image of the specified layer ('model', 'decontaminated residual', or 'model residual') from the
+        inputs returned by `get_layer_inputs()`. This neither reads the state of the Inspector nor the cache of layer
+        images, so it may be called from a worker thread (see LayerImageWorker). `model_image` is used for the
+        'model residual' layer, if it is provided.
+        """
+        if layer == 'model':
+            sim = np.zeros_like(data)
+            # if there is no model, the spectrum was not contaminated. The spectrum itself is essentially the model.
+            utils.add_cutouts(sim, (models.get(str(object_id), spectrum) for object_id, spectrum in spectra.items()))
+            return sim
+        elif layer == 'model residual':
+            if model_image is None:
+                # the model image is not used elsewhere, so the residual can be computed in its place
+                model_image = ViewTab.compute_layer_image('model', data, spectra, models)
+                return np.subtract(data, model_image, out=model_image)
+            return data - model_image
+        elif layer == 'decontaminated residual':
+            decon = np.zeros_like(data)
+            utils.add_cutouts(decon, spectra.values())
+            return np.subtract(data, decon, out=decon)
+        else:
+            raise ValueError(f'{layer} is not a model or residual layer.')
+
+    def clear_layer_images(self):
+        """
+        Discards the cached layer images and pixmaps, and the results of any layer images that are still being
+        computed. This must be called whenever the exposures or the spectra are replaced.
+        """
+        self._layer_images.clear()
+        self._pending_layers.clear()
+        self._layer_pixmaps.clear()
+
+        # the results of the workers that are still running carry the previous generation, so they are rejected
+        self._layer_generation += 1
+
+    def _start_layer_worker(self, layer):
+        """
+        Starts computing and tone-mapping the specified layer of the current detector on a worker thread, so that the
+        GUI remains responsive. The layer is shown by `self._layer_image_ready()` when it is ready. The image of the
+        layer (and, for the model residual, the model image) is taken from the cache of layer images, if possible; the
+        most recently used images are kept, so that switching back to a layer does not repeat the accumulation of all
+        of the spectra on the detector.
+        """
+        dither = self.current_dither
+        detector = self.current_detector
+        key = (dither, detector, layer)
+
+        if key in self._pending_layers:
+            return
+
+        self._pending_layers.add(key)
+
+        image = self._layer_images.get(key)
+        model_image = self._layer_images.get((dither, detector, 'model'))
+        tone_map = self.inspector.get_exposure_tone_map(dither, detector)
+
+        # the worker is given all of its inputs here, so that it does not read the state of the Inspector, which may
+        # change (for instance, if the spectra are reloaded) while the worker is queued or running
+        data, spectra, models = self.get_layer_inputs(dither, detector)
+
+        # the tone-mapped layer is also stored on disk, under a key that identifies the detector image (via the version
+        # of its file, its HDU, its shape, and its tone mapping) and the versions of the files from which the spectra
+        # were loaded
+        cache_key = LayerCache.key(layer, dither, detector, self.inspector.get_exposure_source(dither, detector),
+                                   data.shape, data.dtype, tone_map,
+                                   self.inspector.collection.get_source_files(dither, detector))
+
+        worker = LayerImageWorker(self._layer_generation, dither, detector, layer, data, spectra, models, image,
+                                  model_image, tone_map, self.inspector.layer_cache, cache_key)
+        worker.signals.finished.connect(self._layer_image_ready)
+        QThreadPool.globalInstance().start(worker)
+
+    def _layer_image_ready(self, result):
+        """
+        Receives the image and the tone-mapped pixels of a layer from a LayerImageWorker. The pixmap is created here,
+        on the GUI thread, because QPixmaps may not be created on other threads.
+        """
+        generation, dither, detector, layer, image, pixels = result
+        key = (dither, detector, layer)
+
+        if generation != self._layer_generation:
+            # the exposures or the spectra were replaced while the image was being computed. The same layer may have
+            # been requested again since then, so the key may be pending, but for the newer worker.
+            return
+
+        self._pending_layers.discard(key)
 
-        return data - decon
+        if image is not None:
+            self._layer_images[key] = image
+            self._layer_images.move_to_end(key)
+            if len(self._layer_images) > ViewTab.max_cached_layer_images:
+                self._layer_images.popitem(last=False)
 
-    def get_pixmap(self, image_data):
-        data = self.inspector.exposures[self.current_dither][self.current_detector].data
-        _, pixmap = utils.np_to_pixmap(data, data.max(), data.min(), image_data)
-        return pixmap
+        self._layer_pixmaps[key] = utils.grayscale_to_pixmap(pixels)
+        if len(self._layer_pixmaps) > ViewTab.max_cached_layer_pixmaps:
+            self._layer_pixmaps.popitem(last=False)
+
+        # show the layer, unless a different detector or layer was selected in the meantime
+        if (dither, detector) == (self.current_dither, self.current_detector) and \
+                self.selection_area.data_selector.currentText() == layer:
+            self.change_layer(layer)
 
     def remove_pinned_boxes(self):
-        for item in self.scene.items():
-            if isinstance(item, SpecBox) and item.pinned:
-                self.scene.removeItem(item)
+        for item in self._pinned_boxes:
+            self.scene.removeItem(item)
 
-        if len(self.scene.items()) == 0:
+        self._boxes -= self._pinned_boxes
+        self._pinned_boxes.clear()
+
+        if len(self._boxes) == 0:
             self.boxes_visible = False
 
-    def n_pinned_boxes(self):
-        n = 0
-        for item in self.scene.items():
-            if isinstance(item, SpecBox) and item.pinned:
-                n += 1
+    def discard_boxes(self):
+        """
+        Removes all of the boxes, including the pinned boxes of the detectors that are not displayed. This is called
+        when the spectra or the exposures are replaced, because the boxes refer to the previous ones.
+        """
+        for item in self._boxes:
+            self.scene.removeItem(item)
+
+        self._boxes.clear()
+        self._pinned_boxes.clear()
+        self._stashed_boxes.clear()
+        self.boxes_visible = False
 
-        return n
+    def n_pinned_boxes(self):
+        return len(self._pinned_boxes)
 
     def change_layer(self, layer):
         if self.current_layer == layer:
@@ -374,31 +585,72 @@ class ViewTab(QWidget):
         if layer not in self.LAYERS:
             return
 
-        self.scene.removeItem(self.pixmap_item[self.current_dither][self.current_detector][self.current_layer])
-
-        if self.pixmap_item[self.current_dither][self.current_detector][layer] is None:
-            if layer == 'original':
-                image_data = self.inspector.exposures[self.current_dither][self.current_detector].data
-                pixmap = utils.np_to_pixmap(image_data, image_data.max())
-            elif layer == 'model residual':
-                image_data = self.get_model_residual_image()
-                pixmap = self.get_pixmap(image_data)
-            elif layer == 'decontaminated residual':
-                image_data = self.get_residual_image()
-                pixmap = self.get_pixmap(image_data)
-            elif layer == 'model':
-                print('switching to the model layer')
-                image_data = self.get_model_image()
-                pixmap = self.get_pixmap(image_data)
-
-            pixmap_item = self.scene.addPixmap(pixmap)
-            pixmap_item.setZValue(-1.0)
-            self.pixmap_item[self.current_dither][self.current_detector][layer] = pixmap_item
+        if layer == 'original':
+            pixmap = self.inspector.get_exposure_pixmap(self.current_dither, self.current_detector)
         else:
-            self.scene.addItem(self.pixmap_item[self.current_dither][self.current_detector][layer])
-
-        self.current_layer = layer
+            key = (self.current_dither, self.current_detector, layer)
+            pixmap = self._layer_pixmaps.get(key)
+            if pixmap is None:
+                # the layer is shown when its image is ready
+                self._start_layer_worker(layer)
+                return
+            self._layer_pixmaps.move_to_end(key)
 
+        # only the pixmap of the background item is replaced; the scene's items are neither removed nor added
+        self._background_item.setPixmap(pixmap)
 
+        self.current_layer = layer
 
 
+class LayerImageSignals(QObject):
+    """
+    The signals of a LayerImageWorker. A QRunnable is not a QObject, so it cannot have signals of its own.
+    """
+    finished = pyqtSignal(object)
+
+
+class LayerImageWorker(QRunnable):
+    """
+    Computes and tone-maps a model or residual layer of a detector image on a thread from a QThreadPool (see
+    `ViewTab._start_layer_worker()`). Only the NumPy work is done here; QPixmaps may only be created on the GUI thread,
+    so the results are sent back via `signals.finished`, as a tuple of (generation, dither, detector, layer, image,
+    pixels), where `pixels` is the tone-mapped image, as a uint8 array, and `generation` is the generation of the
+    ViewTab's layer images when the worker was created. The image is computed from `data`, `spectra`, and `models`
+    (see `ViewTab.get_layer_inputs()`). If `image` is provided, it is only tone-mapped. If the
+    tone-mapped image is found in the `layer_cache`, then nothing is computed, and `image` is sent back as it was
+    provided (possibly None).
+    """
+
+    def __init__(self, generation, dither, detector, layer, data, spectra, models, image, model_image, tone_map,
+                 layer_cache, cache_key):
+        super().__init__()
+        self.signals = LayerImageSignals()
+        self._generation = generation
+        self._dither = dither
+        self._detector = detector
+        self._layer = layer
+        self._data = data
+        self._spectra = spectra
+        self._models = models
+        self._image = image
+        self._model_image = model_image
+        self._tone_map = tone_map
+        self._layer_cache = layer_cache
+        self._cache_key = cache_key
+
+    def run(self):
+        image = self._image
+
+        pixels = self._layer_cache.load(self._cache_key)
+
+        if pixels is None:
+            if image is None:
+                image = ViewTab.compute_layer_image(self._layer, self._data, self._spectra, self._models,
+                                                    self._model_image)
+
+            # the image is scaled in the same way as the detector image, using the parameters of its tone mapping
+            pixels, _ = utils.tone_map(image, parameters=self._tone_map)
+
+            self._layer_cache.save(self._cache_key, pixels)
+
+        self.signals.finished.emit((self._generation, self._dither, self._detector, self._layer, image, pixels))